@@ -1,25 +1,276 @@
+import re
+from copy import copy
+
+from Strana.cache import MemoryFragmentCache
+from Strana.exception import UnpackException, WrongPatternForActionException
 from Strana.library import Library
+from Strana.node import GroupNode, LoopNode, TextNode, VariableNode, has_targets, render_body, render_body_async, \
+    stream_body
+from Strana.template import Variable
 
 builtin = Library()
 
 
-@builtin.pattern_action(name='do', pattern='do <> times', need_body=True, need_context=True)
-def do_action(node_id, body, context, times):
-    result = ''
-    try:
-        times = int(times)
+# Used when the context isn't bound to an engine
+default_fragment_cache = MemoryFragmentCache()
+
+
+@builtin.loop_action(name='cache', need_context=True)
+def cache_action(node_id, body, context, key, timeout=None, *vary):
+    cache = getattr(context.engine, 'fragment_cache', None) or default_fragment_cache
+    if vary:
+        key = '{}:{}'.format(key, ':'.join(repr(value) for value in vary))
+    output = cache.get(key)
+    if output is None:
+        if context.awaited is not None:
+            return cache_async(cache, key, timeout, body, context)
+        output = render_body(body, context)
+        cache.set(key, output, timeout)
+    return output
+
+
+async def cache_async(cache, key, timeout, body, context):
+    output = await render_body_async(body, context)
+    cache.set(key, output, timeout)
+    return output
+
+
+class LoopInfo:
+    # The loop variable of for, last is known from one item of lookahead
+    __slots__ = ('index', 'last')
+
+    def __init__(self, index, last):
+        self.index = index
+        self.last = last
+
+    @property
+    def first(self):
+        return self.index == 0
+
+
+class ForNode(LoopNode):
+    __slots__ = ('targets',)
+
+    def __init__(self, targets, expression, body):
+        super().__init__(None, False, body, [expression], {})
+        self.targets = targets
+
+    def call(self, context):
+        return self.iterate(self.args[0].resolve(context), context)
+
+    def bound_names(self):
+        return self.targets + ('loop',)
+
+    async def call_async(self, context):
+        return self.iterate(await self.args[0].resolve_async(context), context)
+
+    def iterate(self, iterable, context):
+        # Items are taken one at a time, generators and cursors are never copied or measured
+        items = iter(iterable)
+        try:
+            item = next(items)
+        except StopIteration:
+            return
+        targets = self.targets
+        index = 0
+        while True:
+            try:
+                following = next(items)
+                last = False
+            except StopIteration:
+                last = True
+            if len(targets) == 1:
+                frame = {targets[0]: item}
+            else:
+                frame = self.unpack(item)
+            frame['loop'] = LoopInfo(index, last)
+            yield from stream_body(self.body, context.push_temporary(frame, self.id))
+            if last:
+                return
+            item = following
+            index += 1
+
+    def unpack(self, item):
+        try:
+            values = tuple(item)
+        except TypeError:
+            raise UnpackException(self.targets, 1, self.args[0].lineno)
+        if len(values) != len(self.targets):
+            raise UnpackException(self.targets, len(values), self.args[0].lineno)
+        return dict(zip(self.targets, values))
+
+
+class DoNode(LoopNode):
+    __slots__ = ('times', 'repeat', 'scoped')
+
+    def __init__(self, times, body):
+        super().__init__(None, False, body, [], {})
+        self.times = times
+        # Text and constant expressions give the same output every time, it's rendered once
+        self.repeat = repeatable(body)
+        # Bodies storing variables get a fresh scope every iteration, others share one
+        self.scoped = has_targets(body)
+
+    def call(self, context):
+        return self.iterate(context)
+
+    def body_changed(self):
+        super().body_changed()
+        self.repeat = repeatable(self.body)
+        self.scoped = has_targets(self.body)
+
+    def bound_names(self):
+        return ('iteration',)
+
+    async def call_async(self, context):
+        return self.iterate(context)
+
+    def iterate(self, context):
+        times = self.times
+        if times <= 0:
+            return
+        if self.repeat:
+            if context.awaited is not None:
+                output = yield render_body_async(self.body, context)
+            else:
+                output = render_body(self.body, context)
+            # One chunk per iteration, streams stay as bounded as the loop's output
+            for i in range(times):
+                yield output
+            return
+        # Async renders render the body nodes after the loop is done, they need a scope per iteration
+        if self.scoped or context.awaited is not None:
+            for i in range(times):
+                yield from stream_body(self.body, context.push_temporary({'iteration': i}, self.id))
+            return
+        frame = {'iteration': 0}
+        child = context.push_temporary(frame, self.id)
         for i in range(times):
-            c = context.push_temporary({'iteration': i}, node_id)
-            result += ''.join([str(node.render(c)) for node in body])
-    except ValueError:
-        pass
-    return result
-
-@builtin.pattern_action(name='for',pattern='for <> in <>',need_body=True,need_context=True)
-def for_action(node_id,body,context,i,l):
-    result = ''
-    li = context[l]
-    for x in li:
-        c = context.push_temporary({i:x},node_id)
-        result += ''.join([str(node.render(c)) for node in body])
-    return result
+            frame['iteration'] = i
+            yield from stream_body(self.body, child)
+
+
+def repeatable(body):
+    for node in body:
+        if type(node) is TextNode:
+            continue
+        # Any lookup can end in a callable, which is called again every iteration
+        if type(node) is not VariableNode or not node.modifier_expression.is_constant():
+            return False
+    return True
+
+
+class IncludeNode(GroupNode):
+    __slots__ = ('name',)
+
+    def __init__(self, name, body):
+        super().__init__(body)
+        self.name = name
+
+
+class BlockNode(GroupNode):
+    __slots__ = ('name',)
+
+    def __init__(self, name, body):
+        super().__init__(body)
+        self.name = name
+
+
+class ExtendsNode(GroupNode):
+    __slots__ = ('name', 'overrides')
+
+    def __init__(self, name, body, overrides=()):
+        super().__init__(body)
+        self.name = name
+        # The blocks of the child template linked into the body of the parent
+        self.overrides = overrides
+
+
+def template_name(token, lineno, action):
+    bits = token.split()
+    name = Variable(bits[1], lineno).literal if len(bits) == 2 else None
+    if not isinstance(name, str):
+        raise WrongPatternForActionException('{} "name"'.format(action), token.contents, lineno)
+    return name
+
+
+for_re = re.compile(r'for\s+(.+?)\s+in\s+(.+)', re.S)
+target_re = re.compile(r'\w+')
+do_re = re.compile(r'do\s+(\d+)\s+times')
+
+
+def do_for(parser, token, lineno):
+    match = for_re.fullmatch(token.contents)
+    targets = tuple(target.strip() for target in match.group(1).split(',')) if match else ()
+    if not targets or not all(target_re.fullmatch(target) for target in targets):
+        raise WrongPatternForActionException('for name[, name...] in expression', token.contents, lineno)
+    expression = parser.compile_modifier(match.group(2).strip(), lineno)
+    body = parser.parse(('/for',))
+    parser.skip_past('/for')
+    return ForNode(targets, expression, body)
+
+
+def do_do(parser, token, lineno):
+    # The count is a literal, it's parsed once here
+    match = do_re.fullmatch(token.contents)
+    if match is None:
+        raise WrongPatternForActionException('do <number> times', token.contents, lineno)
+    body = parser.parse(('/do',))
+    parser.skip_past('/do')
+    return DoNode(int(match.group(1)), body)
+
+
+def do_include(parser, token, lineno):
+    name = template_name(token, lineno, 'include')
+    # The included template comes parsed from the engine, its nodes are rendered in place
+    return IncludeNode(name, parser.load_template(name).node_list)
+
+
+def do_block(parser, token, lineno):
+    bits = token.split()
+    if len(bits) != 2:
+        raise WrongPatternForActionException('block name', token.contents, lineno)
+    body = parser.parse(('/block',))
+    parser.skip_past('/block')
+    return BlockNode(bits[1], body)
+
+
+def do_extends(parser, token, lineno):
+    name = template_name(token, lineno, 'extends')
+    parent = parser.load_template(name)
+    blocks = {}
+    collect_blocks(parser.parse(), blocks)
+    # The blocks of the parent are replaced once here, nothing is looked up while rendering
+    return ExtendsNode(name, link_blocks(parent.node_list, blocks), list(blocks.values()))
+
+
+def collect_blocks(nodes, blocks):
+    for node in nodes:
+        if isinstance(node, BlockNode):
+            blocks[node.name] = node
+        if isinstance(node, (BlockNode, LoopNode)):
+            collect_blocks(node.body, blocks)
+
+
+def link_blocks(nodes, blocks):
+    linked = []
+    for node in nodes:
+        if isinstance(node, BlockNode) and node.name in blocks:
+            node = blocks[node.name]
+        elif isinstance(node, (BlockNode, ExtendsNode, LoopNode)):
+            body = link_blocks(node.body, blocks)
+            if any(new is not old for new, old in zip(body, node.body)):
+                # Parents are shared through the engine cache, they're copied rather than changed
+                node = copy(node)
+                node.body = body
+                if isinstance(node, LoopNode):
+                    node.body_changed()
+        linked.append(node)
+    return linked
+
+
+builtin.register_action('do', do_do, True)
+builtin.register_action('for', do_for, True)
+builtin.register_action('include', do_include)
+builtin.register_action('block', do_block, True)
+builtin.register_action('extends', do_extends)
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Bump whenever the layout of the parsed nodes changes, so stale caches are ignored
+CACHE_VERSION = 11
+
+
+class FileSystemCache:
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def key(self, source, registry, templates_path=''):
+        digest = hashlib.sha256()
+        digest.update(str(CACHE_VERSION).encode())
+        # Included and extended templates are found below the templates path of the engine
+        digest.update(os.path.abspath(templates_path).encode() if templates_path else b'')
+        for signature in registry.library_signatures():
+            digest.update(repr(signature).encode())
+        digest.update(source.encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.strana')
+
+    def load(self, key):
+        try:
+            with open(self.path(key), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Corrupted entries, or nodes referring to functions which no longer exist
+            return None
+
+    def dump(self, key, value):
+        try:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # Nodes holding closures or lambdas can't be stored, they're parsed every time
+            return False
+        fd, temp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self.path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        return True
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.strana'):
+                os.remove(os.path.join(self.directory, name))
+
+
+class MemoryFragmentCache:
+    # Rendered fragments kept in this process, evicting the least recently used ones past max_bytes
+    def __init__(self, max_bytes=16 * 1024 * 1024, default_timeout=300):
+        self.max_bytes = max_bytes
+        self.default_timeout = default_timeout
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires, size = entry
+            if expires is not None and expires < time.monotonic():
+                self.remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.default_timeout
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            expires = time.monotonic() + timeout if timeout else None
+            self.entries[key] = (value, expires, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        self.size -= self.entries.pop(key)[2]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class FileFragmentCache:
+    # Rendered fragments kept in files, shared by every process using the directory
+    def __init__(self, directory, default_timeout=300):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.default_timeout = default_timeout
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + '.fragment')
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                expires = float(f.readline())
+                if not expires or expires >= time.time():
+                    return f.read()
+        except (OSError, ValueError):
+            return None
+        # Expired, another process may be removing it too
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    def set(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.default_timeout
+        expires = time.time() + timeout if timeout else 0
+        fd, temp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                f.write('{!r}\n'.format(expires))
+                f.write(value)
+            os.replace(temp_path, self.path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.fragment'):
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,150 @@
+from copy import copy
+
+from Strana.builtin import DoNode, ForNode, cache_action
+from Strana.node import GroupNode, Node, TextNode, VariableNode, LoopNode
+from Strana.template import Variable, call_value
+
+
+class CompiledNode(Node):
+    __slots__ = ('render_func', 'stream_func', 'source')
+
+    def __init__(self, render_func, stream_func, source):
+        super().__init__()
+        self.render_func = render_func
+        self.stream_func = stream_func
+        self.source = source
+
+    def render(self, context):
+        return self.render_func(context)
+
+    def stream(self, context):
+        return self.stream_func(context)
+
+    def __repr__(self):
+        return '<{}>'.format(self.__class__.__name__)
+
+
+class CodeGenerator:
+    def __init__(self):
+        self.namespace = {'_str': str, '_callable': callable, '_call_value': call_value}
+        self.lines = []
+        self.indent = 1
+        self.counter = 0
+        self.streaming = False
+        self.loops = {}
+        self.text = []
+
+    def bind(self, value, prefix='_k'):
+        self.counter += 1
+        name = '{}{}'.format(prefix, self.counter)
+        self.namespace[name] = value
+        return name
+
+    def write(self, line):
+        self.lines.append('    ' * self.indent + line)
+
+    def emit(self, expr):
+        self.flush_text()
+        if self.streaming:
+            self.write('yield {}'.format(expr))
+        else:
+            self.write('_append({})'.format(expr))
+
+    def flush_text(self):
+        # Text from neighbouring nodes (including inlined groups) is written as one constant
+        if self.text:
+            text = ''.join(self.text)
+            self.text = []
+            self.emit(repr(text))
+
+    def emit_node(self, name):
+        self.flush_text()
+        if self.streaming:
+            self.write('yield from {}.stream(context)'.format(name))
+        else:
+            self.write('_append(_str({}.render(context)))'.format(name))
+
+    def generate(self, node_list):
+        self.streaming = False
+        self.write('_buf = []')
+        self.write('_append = _buf.append')
+        for node in node_list:
+            self.visit(node)
+        self.flush_text()
+        self.write("return ''.join(_buf)")
+        source = 'def render(context):\n' + '\n'.join(self.lines) + '\n'
+
+        # The streaming variant yields every chunk instead of collecting them
+        self.streaming = True
+        self.lines = []
+        self.write('if False:')
+        self.write('    yield')
+        for node in node_list:
+            self.visit(node)
+        self.flush_text()
+        return source + '\n\ndef stream(context):\n' + '\n'.join(self.lines) + '\n'
+
+    def visit(self, node):
+        # Only the exact builtin node types are inlined, subclasses may override render.
+        if type(node) is TextNode:
+            self.text.append(str(node.text))
+        elif type(node) is VariableNode:
+            self.visit_variable(node)
+        elif isinstance(node, GroupNode) and type(node).render is GroupNode.render:
+            for child in node.body:
+                self.visit(child)
+        elif isinstance(node, LoopNode):
+            self.visit_loop(node)
+        else:
+            self.emit_node(self.bind(node, '_n'))
+
+    def visit_variable(self, node):
+        self.flush_text()
+        expr = node.modifier_expression
+        var = expr.var
+        if not isinstance(var, Variable):
+            self.write('_v = {}'.format(self.bind(var)))
+        elif var.lookups is None:
+            self.write('_v = {}'.format(self.bind(var.literal)))
+        elif len(var.lookups) == 1:
+            self.write('try:')
+            self.write('    _v = context[{!r}]'.format(var.lookups[0]))
+            self.write('except KeyError:')
+            self.write('    _v = {}._lookup(context)'.format(self.bind(var, '_var')))
+            self.write('else:')
+            self.write('    if _callable(_v):')
+            self.write('        _v = _call_value(_v, context)')
+        else:
+            self.write('_v = {}._lookup(context)'.format(self.bind(var, '_var')))
+        if expr.memo is not None:
+            self.write('_v = {}.apply_modifiers(_v, context)'.format(self.bind(expr, '_expr')))
+            self.emit('_str(_v)')
+            return
+        for func, args in expr.modifiers:
+            arg_names = []
+            for lookup, arg in args:
+                if lookup:
+                    arg_names.append('{}.resolve(context)'.format(self.bind(arg, '_var')))
+                else:
+                    arg_names.append(self.bind(arg))
+            self.write('_v = {}({})'.format(self.bind(func, '_m'), ', '.join(['_v'] + arg_names)))
+        self.emit('_str(_v)')
+
+    def visit_loop(self, node):
+        # Custom loop actions get the body they were written for, only the builtin ones run a compiled one
+        if type(node) not in (ForNode, DoNode) and not (type(node) is LoopNode and node.func is cache_action):
+            self.emit_node(self.bind(node, '_n'))
+            return
+        if id(node) not in self.loops:
+            compiled = copy(node)
+            compiled.body = [compile_nodes(node.body)]
+            self.loops[id(node)] = self.bind(compiled, '_n')
+        self.emit_node(self.loops[id(node)])
+
+
+def compile_nodes(node_list):
+    generator = CodeGenerator()
+    source = generator.generate(node_list)
+    code = compile(source, '<strana template>', 'exec')
+    exec(code, generator.namespace)
+    return CompiledNode(generator.namespace['render'], generator.namespace['stream'], source)
@@ -1,55 +1,107 @@
+import asyncio
 from collections import OrderedDict
-from copy import deepcopy
 
+from Strana.node import node_ids
 
-class ContextStack:
-    def __init__(self):
 
-        self.stack = OrderedDict({'builtin': {'True': True, 'False': False, 'None': None}})
-        self.node_stack = []
+class ContextStack:
+    def __init__(self, parent=None):
+        self.parent = parent
+        if parent is None:
+            self.stack = OrderedDict({'builtin': {'True': True, 'False': False, 'None': None}})
+            # Shared by every stack of the tree, bumped whenever a stack with children changes
+            self.generation = [0]
+        else:
+            self.stack = OrderedDict()
+            self.generation = parent.generation
+        # name -> frame holding it, valid as long as the generation doesn't change
+        self.cache = {}
+        self.cache_generation = self.generation[0]
+        self.has_children = False
+
+    def new_child(self, context, node_id):
+        # The child shares every frame of this stack, lookups fall through and writes stay in the child
+        self.has_children = True
+        child = ContextStack(self)
+        child.push(context, node_id)
+        return child
+
+    def changed(self):
+        if self.has_children:
+            self.generation[0] += 1
+        self.cache.clear()
+        self.cache_generation = self.generation[0]
 
     def push(self, context, node_id):
         if node_id in self.stack:
             self.stack[node_id].update(context)
         else:
             self.stack[node_id] = context
-            self.node_stack.append(node_id)
+        self.changed()
 
     def pop_node(self, node_id):
-        self.node_stack.remove(node_id)
         del self.stack[node_id]
+        self.changed()
 
     def pop(self):
-        del self.stack[self.node_stack[-1]]
-        self.node_stack.pop()
+        self.stack.popitem()
+        self.changed()
+
+    def find_frame(self, item):
+        generation = self.generation[0]
+        stack = self
+        visited = []
+        frame = None
+        while stack is not None:
+            if stack.cache_generation != generation:
+                stack.cache.clear()
+                stack.cache_generation = generation
+            frame = stack.cache.get(item)
+            if frame is not None and item in frame:
+                break
+            frame = None
+            visited.append(stack)
+            for ctx in reversed(stack.stack.values()):
+                if item in ctx:
+                    frame = ctx
+                    break
+            if frame is not None:
+                break
+            stack = stack.parent
+        if frame is not None:
+            for stack in visited:
+                stack.cache[item] = frame
+        return frame
 
     def __getitem__(self, item):
-        result = None
-        for node, ctx in reversed(self.stack.items()):
-
-            try:
-                result = ctx[item]
-                return result
-            except KeyError:
-                pass
-        if result is None:
-            raise KeyError
+        frame = self.find_frame(item)
+        if frame is None:
+            raise KeyError(item)
+        return frame[item]
 
     def __setitem__(self, key, value):
-        self.stack[self.node_stack[-1]][key] = value
+        self.stack[next(reversed(self.stack))][key] = value
+        self.changed()
+
+    def frames(self):
+        frames = [] if self.parent is None else self.parent.frames()
+        frames.extend(self.stack.items())
+        return frames
 
     def __str__(self):
-        return str(self.stack)
+        return str(OrderedDict(self.frames()))
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        del self.stack[self.node_stack[-1]]
-        self.node_stack.pop()
+        self.pop()
 
 
 class Context:
+    # id -> (awaitable, future) during render_async, None otherwise
+    awaited = None
+
     def __init__(self, engine, context, node_id):
         self.engine = engine
         self.context = ContextStack()
@@ -61,12 +113,39 @@ class Context:
     def push_temporary(self, ctx, node_id):
         if not isinstance(ctx, dict):
             raise Exception  # TODO:Not a dict
-        temp_context = deepcopy(self)
+        temp_context = self.__class__.__new__(self.__class__)
+        temp_context.__dict__.update(self.__dict__)
         temp_context.node_id = node_id
-        temp_context.context.push(ctx, node_id)
+        temp_context.context = self.context.new_child(ctx, node_id)
 
         return temp_context
 
+    def for_render(self):
+        # A child stack with a last frame for the render to write to, the frames of this context are only read.
+        # Any number of renders can share a context, in any number of threads.
+        node_id = next(node_ids)
+        return self.push_temporary({}, node_id)
+
+    def for_async(self):
+        # Values awaited by one render are kept until it ends
+        async_context = self.for_render()
+        async_context.awaited = {}
+        return async_context
+
+    def wait(self, value):
+        # The same awaitable may be reached from many nodes, it's only awaited once
+        entry = self.awaited.get(id(value))
+        if entry is None:
+            entry = self.awaited[id(value)] = (value, asyncio.ensure_future(value))
+        return entry[1]
+
+    def __getstate__(self):
+        # Engines can't be pickled, the receiving side binds its own
+        state = self.__dict__.copy()
+        state['engine'] = None
+        state.pop('awaited', None)
+        return state
+
     def __enter__(self):
         return self
 
@@ -82,12 +161,7 @@ class Context:
         self.context[key] = value
 
     def __getitem__(self, item):
-        result = None
-        try:
-            result = self.context[item]
-            return result
-        except KeyError:
-            raise
+        return self.context[item]
 
     def pop_last(self):
         self.context.pop()
@@ -1,8 +1,14 @@
 import os
+import threading
+from collections import OrderedDict
+
+from Strana.cache import FileSystemCache, MemoryFragmentCache
+from Strana.exception import RecursiveTemplateException
 
 
 class Engine:
-    def __init__(self, libraries=None, string_if_invalid='', templates_path=''):
+    def __init__(self, libraries=None, string_if_invalid='', templates_path='', compiled=False, cache_size=128,
+                 auto_reload=True, cache_dir=None, fragment_cache=None, profiler=None, strict_variables=None):
         if libraries is None:
             self.libraries = []
         else:
@@ -10,6 +16,7 @@ class Engine:
                 raise Exception  # TODO:Not a list
             self.libraries = libraries
         self.string_if_invalid = string_if_invalid
+        self.compiled = compiled
         if templates_path == '':
             self.templates_path = os.getcwd() + '/templates'
         else:
@@ -17,11 +24,34 @@ class Engine:
                 raise Exception  # TODO:Not a directory
 
             self.templates_path = templates_path
+        # cache_size of None keeps every template, 0 disables the cache
+        self.cache_size = cache_size
+        # When False, cached templates are never checked against the disk
+        self.auto_reload = auto_reload
+        self.templates = OrderedDict()
+        self.loading = set()
+        # get_template is called from any thread, and again by the templates it's parsing
+        self.lock = threading.RLock()
+        # Backend of the cache action, an in-process LRU cache when not given
+        self.fragment_cache = fragment_cache
+        # Parsed templates are also stored on disk, so new processes don't have to parse them again
+        self.disk_cache = None
+        if cache_dir is not None:
+            self.disk_cache = FileSystemCache(cache_dir)
+        if self.fragment_cache is None:
+            self.fragment_cache = MemoryFragmentCache()
+        # A Strana.profile.Profiler here times every render of the templates of this engine
+        self.profiler = profiler
+        # Names every template may read, templates reading others fail to load
+        self.strict_variables = strict_variables
 
-    def load_template(self, name):
+    def template_path(self, name):
         if name.find('.') == -1:
             name += '.ptm'
-        name = os.path.join(self.templates_path, name)
+        return os.path.join(self.templates_path, name)
+
+    def load_template(self, name):
+        name = self.template_path(name)
         if not os.path.isfile(name):
             raise Exception  # TODO:File doesn't exist
         template_contents = ''
@@ -29,8 +59,63 @@ class Engine:
             template_contents = f.read()
         return template_contents
 
+    def get_template(self, name):
+        with self.lock:
+            nested = bool(self.loading)
+            template = self.find_template(name)
+            if self.strict_variables is not None and not nested and not template.checked:
+                template.check_variables(self.strict_variables)
+            return template
+
+    def find_template(self, name):
+        path = self.template_path(name)
+        entry = self.templates.get(path)
+        if entry is not None:
+            template, mtime, size = entry
+            if not self.auto_reload or (self.is_fresh(path, mtime, size) and
+                                        all(self.is_fresh(*dependency) for dependency in template.dependencies)):
+                self.templates.move_to_end(path)
+                return template
+            del self.templates[path]
+
+        from Strana.template import Template
+        if not os.path.isfile(path):
+            raise Exception  # TODO:File doesn't exist
+        if path in self.loading:
+            raise RecursiveTemplateException(name)
+        stat = os.stat(path)
+        self.loading.add(path)
+        try:
+            with open(path, 'r') as f:
+                # The disk cache is keyed by the source, otherwise the file is lexed as it's read
+                template = Template(f.read() if self.disk_cache is not None else f, self, check=False)
+        finally:
+            self.loading.discard(path)
+        template.name = name
+        if self.cache_size != 0:
+            self.templates[path] = (template, stat.st_mtime, stat.st_size)
+            if self.cache_size is not None and len(self.templates) > self.cache_size:
+                self.templates.popitem(last=False)
+        return template
+
+    def file_state(self, name):
+        path = self.template_path(name)
+        stat = os.stat(path)
+        return path, stat.st_mtime, stat.st_size
+
+    def is_fresh(self, path, mtime, size):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_mtime == mtime and stat.st_size == size
+
+    def clear_cache(self):
+        with self.lock:
+            self.templates.clear()
+
 
 class DefaultEngine(Engine):
-    def __init__(self, path=''):
+    def __init__(self, path='', **options):
         from Strana.builtin import builtin
-        super().__init__([builtin], 'Invalid method call', path)
+        super().__init__([builtin], 'Invalid method call', path, **options)
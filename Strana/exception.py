@@ -92,3 +92,31 @@ class VariableParseException(Exception):
 
     def __str__(self):
         return self.msg
+
+
+class RecursiveTemplateException(Exception):
+    def __init__(self, name):
+        self.name = name
+        self.msg = 'Template {} includes or extends itself'.format(name)
+
+    def __str__(self):
+        return self.msg
+
+
+class UnpackException(Exception):
+    def __init__(self, targets, count, lineno):
+        self.lineno = lineno
+        self.msg = 'Cannot unpack {} values into {} at line {}'.format(count, ', '.join(targets), lineno)
+
+    def __str__(self):
+        return self.msg
+
+
+class UnknownVariableException(Exception):
+    def __init__(self, variables):
+        self.variables = variables
+        self.msg = 'Unknown variables: {}'.format(
+            ', '.join('{} at line {}'.format(path, lineno) for path, lineno in variables))
+
+    def __str__(self):
+        return self.msg
@@ -1,6 +1,6 @@
 import functools
 import re
-from inspect import getfullargspec
+from inspect import getfullargspec, signature
 
 from Strana.node import BasicNode, LoopNode
 from Strana.template import parse_args
@@ -10,6 +10,8 @@ class Library:
     def __init__(self):
         self.actions = {}
         self.modifiers = {}
+        # Bumped on every registration, registries built from this library check it
+        self.version = 0
 
     def register_action(self, name=None, compiled_func=None, is_loop=False):
         end = None
@@ -29,6 +31,7 @@ class Library:
                 return decorate
         elif name is not None and compiled_func is not None:
             self.actions[name] = compiled_func
+            self.version += 1
             return compiled_func
         else:
             raise ValueError('Unsupported arguments')
@@ -37,17 +40,20 @@ class Library:
 
         setattr(fun, 'end', end)
         self.actions[getattr(fun, '_decorated_function', fun).__name__] = fun
+        self.version += 1
         return fun
 
-    def loop_action(self, func=None, need_context=False, name=None, node=None):
+    def loop_action(self, func=None, need_context=False, name=None, node=None, binds=()):
         def dec(func):
+            # Names the action sets in the context of its body
+            func.binds = tuple(binds)
             params, varargs, varkw, defaults, kwonly, kwonly_defaults, _ = getfullargspec(func)
             function_name = (name or getattr(func, '_decorated_function', func).__name__)
 
             @functools.wraps(func)
-            def compile_func(parser, token, lineno):
-
-                bits = token.split()[1:]
+            def compile_func(parser, token, lineno, groups=None):
+                # groups: what the pattern of a pattern action captured, they're passed as they are
+                bits = token.split()[1:] if groups is None else list(groups)
                 # bits = []
                 # splits = split(token)
                 # for bit in splits:
@@ -58,11 +64,12 @@ class Library:
 
                 if params[1] == 'body':
                     end = '/' + function_name
-                if len(bits) >= 2 and bits[-2] == 'as':
+                if groups is None and len(bits) >= 2 and bits[-2] == 'as':
                     raise Exception  # TODO:Can't have as
                 args, kwargs = parse_args(lineno,
                                           parser, bits, params, varargs, varkw, defaults,
-                                          kwonly, kwonly_defaults, need_context, function_name, True
+                                          kwonly, kwonly_defaults, need_context, function_name, True,
+                                          groups is not None
                                           )
                 body = parser.parse((end,))
                 parser.skip_past(end)
@@ -80,22 +87,18 @@ class Library:
         else:
             raise ValueError('Unsupported arguments')
 
-    def pattern_action(self, func=None, need_context=False, name=None, pattern=None, need_body=False, node=None):
+    def pattern_action(self, func=None, need_context=False, name=None, pattern=None, need_body=False, node=None,
+                       binds=()):
         if pattern is None:
             raise Exception  # TODO:No pattern provided to pattern tag
 
         def dec(func):
-            args_match_re = re.compile('<.*?>')
-            args = []
-            a = args_match_re.finditer(pattern)
-            for i in a:
-                args.append(i)
-
-            pat = re.sub('<>', '(\w+)', pattern)
+            pat = pattern.replace('<>', r'(\w+)')
 
-            setattr(func, 'pattern', pat)
+            # Compiled once, the parser matches every token of the action against it
+            setattr(func, 'pattern', re.compile(pat))
             if need_body:
-                return self.loop_action(func, need_context, name, node)
+                return self.loop_action(func, need_context, name, node, binds)
             else:
                 return self.basic_action(func, need_context, name, node)
 
@@ -112,16 +115,17 @@ class Library:
             function_name = (name or getattr(func, '_decorated_function', func).__name__)
 
             @functools.wraps(func)
-            def compile_func(parser, token, lineno):
-                bits = token.split()[1:]
+            def compile_func(parser, token, lineno, groups=None):
+                bits = token.split()[1:] if groups is None else list(groups)
                 target_var = None
 
-                if len(bits) >= 2 and bits[-2] == 'as':
+                if groups is None and len(bits) >= 2 and bits[-2] == 'as':
                     target_var = bits[-1]
                     bits = bits[:-2]
                 args, kwargs = parse_args(lineno,
                                           parser, bits, params, varargs, varkw, defaults,
-                                          kwonly, kwonly_defaults, need_context, function_name
+                                          kwonly, kwonly_defaults, need_context, function_name,
+                                          literal=groups is not None
                                           )
                 if node is None:
                     return BasicNode(func, need_context, args, kwargs, target_var)
@@ -155,11 +159,30 @@ class Library:
                 return dec
         elif name is not None and modifier_func is not None:
             self.modifiers[name] = modifier_func
+            self.version += 1
             modifier_func._modifier_name = name
+            # pure=True: the output only depends on the input and the arguments
+            for flag, value in flags.items():
+                setattr(modifier_func, flag, value)
             return modifier_func
         else:
             raise ValueError  # TODO:Unsupported args to modifier
 
+    def signature(self):
+        # Describes what the library registers, parsed nodes are only valid for the same signature
+        def describe(func):
+            wrapped = getattr(func, '__wrapped__', func)
+            try:
+                sig = str(signature(wrapped))
+            except (TypeError, ValueError):
+                sig = None
+            pattern = getattr(func, 'pattern', None)
+            return (getattr(wrapped, '__module__', None), getattr(wrapped, '__qualname__', None),
+                    getattr(pattern, 'pattern', pattern), getattr(func, 'pure', False), sig)
+
+        return (sorted((name, describe(func)) for name, func in self.actions.items()),
+                sorted((name, describe(func)) for name, func in self.modifiers.items()))
+
     def modifier_function(self, func, **flags):
         name = getattr(func, "_decorated_function", func).__name__
         return self.register_modifier(name, func, **flags)
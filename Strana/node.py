@@ -1,18 +1,133 @@
-import uuid
+import asyncio
+from inspect import isawaitable, isgenerator
+from itertools import count
+
+# Node ids only have to be unique among the frames of a context stack, a counter is enough
+node_ids = count()
 
 
 class Node:
+    __slots__ = ('id', 'token')
+
     def __init__(self):
-        self.id = uuid.uuid4()
+        self.id = next(node_ids)
+
+    def __setstate__(self, state):
+        # Nodes coming from a pickle (disk cache, other processes) get an id of this process
+        if isinstance(state, tuple):
+            state, slots = state
+            if slots:
+                for name, value in slots.items():
+                    setattr(self, name, value)
+        if state:
+            self.__dict__.update(state)
+        self.id = next(node_ids)
 
     def render(self, context):
         pass
 
+    def stream(self, context):
+        yield str(self.render(context))
+
+    async def render_async(self, context):
+        return self.render(context)
+
     def __iter__(self):
         yield self
 
 
+class Deferred:
+    # Stands for the output of a node in async renders, the loop node renders it
+    __slots__ = ('node', 'context')
+
+    def __init__(self, node, context):
+        self.node = node
+        self.context = context
+
+
+def render_body(body, context):
+    return ''.join([str(node.render(context)) for node in body])
+
+
+async def render_body_async(body, context):
+    return ''.join([str(await node.render_async(context)) for node in body])
+
+
+def stream_body(body, context):
+    if context.awaited is not None:
+        for node in body:
+            yield Deferred(node, context)
+        return
+    for node in body:
+        yield from node.stream(context)
+
+
+async def render_chunks_async(chunks, concurrent):
+    # Chunks of a generator action, awaitables it yields are awaited and sent back to it
+    output = []
+    deferred = []
+    value = None
+    while True:
+        try:
+            chunk = chunks.send(value)
+        except StopIteration:
+            break
+        value = None
+        if type(chunk) is Deferred:
+            node = chunk.node
+            if type(node).render_async is Node.render_async:
+                output.append(str(node.render(chunk.context)))
+            elif concurrent:
+                deferred.append((len(output), node.render_async(chunk.context)))
+                output.append(None)
+            else:
+                output.append(str(await node.render_async(chunk.context)))
+        elif isawaitable(chunk):
+            value = await chunk
+        else:
+            output.append(str(chunk))
+    if deferred:
+        results = await asyncio.gather(*[coroutine for _, coroutine in deferred])
+        for (i, _), result in zip(deferred, results):
+            output[i] = str(result)
+    return ''.join(output)
+
+
+def collect_variables(body, bound, found):
+    # Fills found with path -> first line it's read at, for the paths whose root isn't in bound
+    bound = set(bound)
+    for node in body:
+        if isinstance(node, VariableNode):
+            expressions = [node.modifier_expression]
+        elif isinstance(node, HelperNode):
+            expressions = list(node.args) + list(node.kwargs.values())
+        else:
+            expressions = []
+        for expression in expressions:
+            for var in expression.variables():
+                if var.lookups[0] not in bound and var.var not in found:
+                    found[var.var] = var.lineno
+        if isinstance(node, LoopNode):
+            collect_variables(node.body, bound.union(node.bound_names()), found)
+        elif isinstance(node, GroupNode):
+            collect_variables(node.body, bound, found)
+        elif isinstance(node, BasicNode) and node.target is not None:
+            # Stored variables are there for the rest of the scope
+            bound.add(node.target)
+
+
+def has_targets(body):
+    for node in body:
+        if isinstance(node, BasicNode) and node.target is not None:
+            return True
+        if isinstance(node, GroupNode) and has_targets(node.body):
+            return True
+    return False
+
+
 class TextNode(Node):
+    __slots__ = ('text',)
+
     def __init__(self, text):
         super().__init__()
         self.text = text
@@ -25,6 +140,8 @@ class TextNode(Node):
 
 
 class VariableNode(Node):
+    __slots__ = ('modifier_expression',)
+
     def __init__(self, modifier_expression):
         super().__init__()
         self.modifier_expression = modifier_expression
@@ -32,11 +149,37 @@ class VariableNode(Node):
     def render(self, context):
         return self.modifier_expression.resolve(context)
 
+    async def render_async(self, context):
+        return await self.modifier_expression.resolve_async(context)
+
     def __repr__(self):
         return '<{}:{}>'.format(self.__class__.__name__, self.modifier_expression)
 
 
+class GroupNode(Node):
+    # Renders its body in place, the compiler inlines the body of these nodes
+    __slots__ = ('body',)
+
+    def __init__(self, body):
+        super().__init__()
+        self.body = body
+
+    def render(self, context):
+        return render_body(self.body, context)
+
+    def stream(self, context):
+        return stream_body(self.body, context)
+
+    async def render_async(self, context):
+        return await render_body_async(self.body, context)
+
+    def __repr__(self):
+        return '<{}: {} nodes>'.format(self.__class__.__name__, len(self.body))
+
+
 class HelperNode(Node):
+    __slots__ = ('func', 'need_context', 'args', 'kwargs')
+
     def __init__(self, func, need_context, args, kwargs):
         super().__init__()
         self.func = func
@@ -51,8 +194,17 @@ class HelperNode(Node):
         resolved_kwargs = {k: v.resolve(context) for k, v in self.kwargs.items()}
         return resolved_args, resolved_kwargs
 
+    async def get_args_async(self, context):
+        resolved_args = [await var.resolve_async(context) for var in self.args]
+        if self.need_context:
+            resolved_args = [context] + resolved_args
+        resolved_kwargs = {k: await v.resolve_async(context) for k, v in self.kwargs.items()}
+        return resolved_args, resolved_kwargs
+
 
 class BasicNode(HelperNode):
+    __slots__ = ('target',)
+
     def __init__(self, func, need_context, args, kwargs, target):
         super().__init__(func, need_context, args, kwargs)
         self.target = target
@@ -65,13 +217,64 @@ class BasicNode(HelperNode):
             return ''
         return output
 
+    async def render_async(self, context):
+        resolved_args, resolved_kwargs = await self.get_args_async(context)
+        output = self.func(self.id, *resolved_args, **resolved_kwargs)
+        if isawaitable(output):
+            output = await output
+        if self.target is not None:
+            context.push_permanent({self.target: output}, self.id)
+            return ''
+        return output
+
 
 class LoopNode(HelperNode):
+    __slots__ = ('body', 'concurrent')
+
     def __init__(self, func, need_context, body, args, kwargs):
         super().__init__(func, need_context, args, kwargs)
         self.body = body
+        # Whether render_async may render the body nodes at the same time, known on first use
+        self.concurrent = None
 
-    def render(self, context):
+    def call(self, context):
         resolved_args, resolved_kwargs = self.get_args(context)
-        output = self.func(self.id, self.body, *resolved_args, **resolved_kwargs)
+        return self.func(self.id, self.body, *resolved_args, **resolved_kwargs)
+
+    async def call_async(self, context):
+        resolved_args, resolved_kwargs = await self.get_args_async(context)
+        return self.func(self.id, self.body, *resolved_args, **resolved_kwargs)
+
+    def body_changed(self):
+        # What was worked out from the previous body
+        self.concurrent = None
+
+    def bound_names(self):
+        # Names the action sets for its body, declared with the binds argument of the Library decorators
+        return getattr(self.func, 'binds', ())
+
+    def render(self, context):
+        output = self.call(context)
+        if isgenerator(output):
+            return ''.join([str(chunk) for chunk in output])
         return output
+
+    def stream(self, context):
+        # Actions written as generators hand out their output piece by piece
+        output = self.call(context)
+        if isgenerator(output):
+            for chunk in output:
+                yield str(chunk)
+        else:
+            yield str(output)
+
+    async def render_async(self, context):
+        output = await self.call_async(context)
+        if isawaitable(output):
+            output = await output
+        if not isgenerator(output):
+            return output
+        if self.concurrent is None:
+            # Nodes storing a variable have to run before the nodes after them
+            self.concurrent = not has_targets(self.body)
+        return await render_chunks_async(output, self.concurrent)
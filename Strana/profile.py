@@ -0,0 +1,127 @@
+import json
+import threading
+from copy import copy
+from time import perf_counter
+
+from Strana.builtin import ExtendsNode, IncludeNode
+from Strana.node import GroupNode, LoopNode, Node
+
+
+class NodeStats:
+    __slots__ = ('kind', 'description', 'template', 'lineno', 'calls', 'cumulative', 'own')
+
+    def __init__(self, node, template):
+        self.kind = node.__class__.__name__
+        self.description = describe(node)
+        self.template = template
+        token = getattr(node, 'token', None)
+        self.lineno = token.lineno if token is not None else None
+        self.calls = 0
+        self.cumulative = 0.0
+        self.own = 0.0
+
+    def as_dict(self):
+        return {'node': self.kind, 'description': self.description, 'template': self.template,
+                'lineno': self.lineno, 'calls': self.calls, 'cumulative': self.cumulative, 'self': self.own}
+
+
+def describe(node):
+    token = getattr(node, 'token', None)
+    if token is not None:
+        return token.contents[:40]
+    return repr(node)[:40]
+
+
+class ProfiledNode(Node):
+    __slots__ = ('node', 'profiler', 'stats')
+
+    def __init__(self, node, profiler, stats):
+        super().__init__()
+        self.node = node
+        self.profiler = profiler
+        self.stats = stats
+
+    def render(self, context):
+        profiler = self.profiler
+        times = getattr(profiler.local, 'times', None)
+        if times is None:
+            times = profiler.local.times = []
+        times.append(0.0)
+        start = perf_counter()
+        try:
+            return self.node.render(context)
+        finally:
+            elapsed = perf_counter() - start
+            children = times.pop()
+            if times:
+                times[-1] += elapsed
+            stats = self.stats
+            with profiler.lock:
+                stats.calls += 1
+                stats.cumulative += elapsed
+                stats.own += elapsed - children
+
+    def __repr__(self):
+        return '<{}: {!r}>'.format(self.__class__.__name__, self.node)
+
+
+class Profiler:
+    # Collects timings over any number of renders, templates are only wrapped while profiling
+    def __init__(self):
+        self.stats = {}
+        self.wrapped = {}
+        # Times of the children of the nodes being rendered, per thread
+        self.local = threading.local()
+        self.lock = threading.RLock()
+
+    def render(self, template, context):
+        key = id(template.node_list)
+        with self.lock:
+            entry = self.wrapped.get(key)
+            if entry is None or entry[0] is not template.node_list:
+                entry = (template.node_list, self.wrap(template.node_list, template.name, {}))
+                self.wrapped[key] = entry
+        return ''.join([str(node.render(context)) for node in entry[1]])
+
+    def wrap(self, node_list, template, overrides):
+        return [self.wrap_node(node, template, overrides) for node in node_list]
+
+    def wrap_node(self, node, template, overrides):
+        # Blocks overriding those of a parent come from the template that extends it
+        template = overrides.get(id(node), template)
+        stats = self.stats.get((template, node.id))
+        if stats is None:
+            stats = self.stats[(template, node.id)] = NodeStats(node, template)
+        # Bodies are wrapped too, so actions rendering them time each child separately
+        if isinstance(node, (GroupNode, LoopNode)):
+            inner = template
+            if isinstance(node, (IncludeNode, ExtendsNode)):
+                inner = node.name
+            if isinstance(node, ExtendsNode):
+                overrides = dict(overrides)
+                overrides.update((id(block), template) for block in node.overrides)
+            node = copy(node)
+            node.body = self.wrap(node.body, inner, overrides)
+        return ProfiledNode(node, self, stats)
+
+    def entries(self, sort='cumulative'):
+        key = {'cumulative': 'cumulative', 'self': 'own', 'calls': 'calls'}[sort]
+        with self.lock:
+            return sorted(self.stats.values(), key=lambda stats: getattr(stats, key), reverse=True)
+
+    def report(self, sort='cumulative', limit=None):
+        lines = ['{:>8} {:>12} {:>12}  {:<24} {:<16} {}'.format('calls', 'cumulative', 'self', 'template:line',
+                                                             'node', 'contents')]
+        for stats in self.entries(sort)[:limit]:
+            location = '{}:{}'.format(stats.template or '<string>', stats.lineno or '?')
+            lines.append('{:>8} {:>12.6f} {:>12.6f}  {:<24} {:<16} {}'.format(
+                stats.calls, stats.cumulative, stats.own, location, stats.kind, stats.description))
+        return '\n'.join(lines)
+
+    def as_json(self, sort='cumulative', **kwargs):
+        return json.dumps([stats.as_dict() for stats in self.entries(sort)], **kwargs)
+
+    def clear(self):
+        with self.lock:
+            self.stats.clear()
+            self.wrapped.clear()
@@ -1,9 +1,18 @@
+import multiprocessing
+import codecs
+import os
+import pickle
 import re
-from inspect import getcallargs, getfullargspec
-
-from Strana.engine import DefaultEngine
+from array import array
+from bisect import bisect_left
+from inspect import getcallargs, getfullargspec, isawaitable, iscoroutinefunction
+from itertools import chain, islice
+from types import MappingProxyType
+
+from Strana.context import Context
+from Strana.engine import DefaultEngine, Engine
 from Strana.exception import *
-from Strana.node import TextNode, VariableNode
+from Strana.node import TextNode, VariableNode, collect_variables, render_body_async
 
 TOKEN_TYPE_TEXT = 0
 TOKEN_TYPE_VAR = 1
@@ -29,12 +38,27 @@ VARIABLE_TAG_START = '{='
 VARIABLE_TAG_END = '=}'
 MODIFIER = '>>'
 MODIFIER_ARGUMENT_SEPARATOR = '=>'
+
+# Entries kept by every expression for the results of its pure modifiers
+MODIFIER_MEMO_SIZE = 256
+
+LOOKUP_ITEM = 0
+LOOKUP_ATTRIBUTE = 1
+LOOKUP_INDEX = 2
+
+# Registries of distinct lists of libraries kept at once
+REGISTRY_CACHE_SIZE = 64
+
+# Always in the context, see ContextStack
+BUILTIN_NAMES = frozenset(('True', 'False', 'None'))
 tag_expr_re = re.compile('({}.*?{}|{}.*?{}|{}.*?{})'.format(
     re.escape(BLOCK_TAG_START), re.escape(BLOCK_TAG_END),
     re.escape(VARIABLE_TAG_START), re.escape(VARIABLE_TAG_END),
     re.escape(COMMENT_TAG_START), re.escape(COMMENT_TAG_END)
 ))
 
+newline_re = re.compile('\n')
+
 split_re = re.compile(r"""
     ((?:
         [^\s'"]*
@@ -52,7 +76,7 @@ def split(text):
 
 
 class Template:
-    def __init__(self, source, engine=None, libraries=None):
+    def __init__(self, source, engine=None, libraries=None, compiled=None, check=True):
         if engine is None:
             self.engine = DefaultEngine()
         else:
@@ -63,103 +87,342 @@ class Template:
         else:
             self.libraries = libraries
         self.source = source
+        # Set by the engine for templates loaded from a file
+        self.name = None
+        self.dependencies = []
         self.node_list = self.compile_nodes()
-
-    def render(self, context):
-        result = ''
+        # Whether check_variables passed. Templates loaded through the engine pass check=False and are checked
+        # by get_template, only when asked for directly: included ones are checked in the scope including them.
+        self.checked = False
+        if check and self.engine.strict_variables is not None:
+            self.check_variables(self.engine.strict_variables)
+        if not isinstance(source, str):
+            # File objects are consumed by the lexer, there's nothing to keep
+            self.source = None
+        if compiled is None:
+            compiled = getattr(self.engine, 'compiled', False)
+        self.compiled = self.compile_code() if compiled else None
+
+    def __getstate__(self):
+        # Engines and libraries hold closures, copies get the parsed nodes and an engine made from its options
+        return {'source': self.source, 'name': self.name, 'node_list': self.node_list,
+                'compiled': self.compiled is not None, 'engine_options': engine_options(self.engine)}
+
+    def __setstate__(self, state):
+        self.engine = Engine(**state['engine_options'])
+        self.libraries = self.engine.libraries
+        self.source = state['source']
+        self.name = state.get('name')
+        self.checked = False
+        self.dependencies = []
+        self.node_list = state['node_list']
+        self.compiled = self.compile_code() if state['compiled'] else None
+
+    def required_variables(self):
+        # root name -> dotted paths read below it, names bound by the template itself are left out
+        found = {}
+        collect_variables(self.node_list, BUILTIN_NAMES, found)
+        required = {}
+        for path in found:
+            required.setdefault(path.split(VARIABLE_ATTRIBUTE_SEPERATOR)[0], set()).add(path)
+        return required
+
+    def check_variables(self, known):
+        found = {}
+        collect_variables(self.node_list, BUILTIN_NAMES, found)
+        unknown = [(path, lineno) for path, lineno in found.items()
+                   if path.split(VARIABLE_ATTRIBUTE_SEPERATOR)[0] not in known]
+        if unknown:
+            raise UnknownVariableException(unknown)
+        self.checked = True
+
+    def compile_code(self):
+        from Strana.compiler import compile_nodes
+        return compile_nodes(self.node_list)
+
+    def render(self, context, profiler=None):
+        # Variables set while rendering go to a frame of this render, the given context is left as it was
+        context = context.for_render()
+        if profiler is None:
+            profiler = self.engine.profiler
+        if profiler is not None:
+            # Profiling times the parsed nodes, compiled code has no per node boundaries
+            return profiler.render(self, context)
+        if self.compiled is not None:
+            return self.compiled.render(context)
+        return ''.join([str(node.render(context)) for node in self.node_list])
+
+    async def render_async(self, context):
+        # Awaitable values are awaited where the template uses them, compiled code is synchronous
+        return await render_body_async(self.node_list, context.for_async())
+
+    def stream(self, context):
+        context = context.for_render()
+        if self.compiled is not None:
+            yield from self.compiled.stream(context)
+            return
         for node in self.node_list:
-            result += str(node.render(context))
-            result += ''
-        return result
+            yield from node.stream(context)
+
+    def render_to(self, context, fileobj):
+        for chunk in self.stream(context):
+            fileobj.write(chunk)
+
+    def render_many(self, contexts, workers=None, chunksize=32, min_parallel=256):
+        # Contexts may be dicts or Context objects, the results come back in the same order
+        contexts = iter(contexts)
+        head = list(islice(contexts, min_parallel))
+        # Profilers only see the renders of their own process
+        if workers == 1 or len(head) < min_parallel or getattr(self.engine, 'profiler', None) is not None:
+            for context in chain(head, contexts):
+                yield self.render(self.make_context(context))
+            return
+        try:
+            payload = pickle.dumps(self, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # Nodes holding closures or lambdas can't be sent to other processes
+            for context in chain(head, contexts):
+                yield self.render(self.make_context(context))
+            return
+        with multiprocessing.Pool(workers, initializer=init_render_worker, initargs=(payload,)) as pool:
+            yield from pool.imap(render_in_worker, chain(head, contexts), chunksize)
+
+    def make_context(self, context):
+        if isinstance(context, Context):
+            return context
+        return Context(self.engine, context, 'root')
 
     def compile_nodes(self):
+        registry = registry_for(self.libraries)
+        disk_cache = getattr(self.engine, 'disk_cache', None)
+        if not isinstance(self.source, str):
+            disk_cache = None
+        if disk_cache is not None:
+            key = disk_cache.key(self.source, registry, getattr(self.engine, 'templates_path', ''))
+            cached = disk_cache.load(key)
+            # Entries built from included or extended templates are only valid while those files don't change
+            if cached is not None and all(self.engine.is_fresh(*dependency) for dependency in cached[0]):
+                self.dependencies = cached[0]
+                return cached[1]
         lexer = Lexer(self.source)
-        li = lexer.tokenize()
-        parser = Parser(li, libraries=self.libraries)
+        parser = Parser(lexer.iter_tokens(), libraries=registry, engine=self.engine)
+        node_list = parser.parse()
+        self.dependencies = parser.dependencies
+        if disk_cache is not None:
+            disk_cache.dump(key, (self.dependencies, node_list))
+        return node_list
+
+
+def engine_options(engine):
+    # The options an engine can be made again from in another process, libraries and profilers stay behind
+    options = {'string_if_invalid': engine.string_if_invalid}
+    for name in ('compiled', 'cache_size', 'auto_reload', 'strict_variables'):
+        if hasattr(engine, name):
+            options[name] = getattr(engine, name)
+    # The default path may not exist, the engine only checks paths it's given
+    if os.path.isdir(getattr(engine, 'templates_path', '')):
+        options['templates_path'] = engine.templates_path
+    disk_cache = getattr(engine, 'disk_cache', None)
+    if disk_cache is not None:
+        options['cache_dir'] = disk_cache.directory
+    fragment_cache = getattr(engine, 'fragment_cache', None)
+    if fragment_cache is not None:
         try:
-            return parser.parse()
-        except Exception as e:
-            raise
+            # In-memory caches hold locks, every worker then starts with its own
+            pickle.dumps(fragment_cache, pickle.HIGHEST_PROTOCOL)
+            options['fragment_cache'] = fragment_cache
+        except Exception:
+            pass
+    return options
 
 
-class Parser:
-    def __init__(self, tokens, libraries=None):
-        self.tokens = tokens
-        self.modifiers = {}
-        if libraries is None:
-            self.libraries = {}
-        else:
-            self.libraries = libraries
+worker_template = None
 
-        self.actions = {}
-        self.stack = []
+
+def init_render_worker(payload):
+    global worker_template
+    worker_template = pickle.loads(payload)
+
+
+def render_in_worker(context):
+    context = worker_template.make_context(context)
+    if context.engine is None:
+        context.engine = worker_template.engine
+    return worker_template.render(context)
+
+
+class Registry:
+    # The actions and modifiers of a list of libraries, merged once and shared by every parser using them
+    def __init__(self, libraries):
+        self.libraries = tuple(libraries)
+        self.versions = tuple(lib.version for lib in self.libraries)
+        actions = {}
+        modifiers = {}
         for lib in self.libraries:
-            self.add_library(lib)
+            actions.update(lib.actions)
+            modifiers.update(lib.modifiers)
+        self.actions = MappingProxyType(actions)
+        self.modifiers = MappingProxyType(modifiers)
+        # Compiled patterns of the pattern actions, by the command word they start with
+        self.patterns = MappingProxyType(patterns_of(actions))
+        self.arities = {}
+        self.signatures = None
+
+    def is_current(self, libraries):
+        # Libraries registering something after the registry was built make it stale
+        return len(libraries) == len(self.libraries) and all(
+            lib is own and lib.version == version for lib, own, version in zip(libraries, self.libraries, self.versions))
+
+    def arity(self, func):
+        # (number of arguments, number of defaults) of a modifier
+        try:
+            return self.arities[func]
+        except KeyError:
+            args, _, _, defaults, _, _, _ = getfullargspec(getattr(func, '_decorated_function', func))
+            arity = self.arities[func] = (len(args), len(defaults or []))
+            return arity
+
+    def library_signatures(self):
+        if self.signatures is None:
+            self.signatures = [lib.signature() for lib in self.libraries]
+        return self.signatures
+
+
+def patterns_of(actions):
+    # Patterns are compiled by Library.pattern_action
+    patterns = {}
+    for name, action in actions.items():
+        pattern = getattr(action, 'pattern', None)
+        if pattern is not None:
+            patterns[name] = pattern
+    return patterns
+
+
+registries = {}
+
+
+def registry_for(libraries):
+    if isinstance(libraries, Registry):
+        return libraries
+    key = tuple(map(id, libraries))
+    registry = registries.get(key)
+    if registry is None or not registry.is_current(libraries):
+        if len(registries) >= REGISTRY_CACHE_SIZE:
+            registries.clear()
+        registry = registries[key] = Registry(libraries)
+    return registry
+
+
+class Parser:
+    def __init__(self, tokens, libraries=None, engine=None):
+        # Tokens are consumed as a stream, pushed back tokens are handed out first
+        self.tokens = iter(tokens)
+        self.pushed = []
+        self.registry = registry_for(libraries or ())
+        self.libraries = self.registry.libraries
+        self.actions = self.registry.actions
+        self.modifiers = self.registry.modifiers
+        self.patterns = self.registry.patterns
+        self.stack = []
+        self.engine = engine
+        # (path, mtime, size) of every template file the parsed nodes were built from
+        self.dependencies = []
 
     def parse(self, stop=None):
         node_list = []
         if stop is None:
             stop = []
 
-        while self.tokens:
+        while self.has_tokens():
             token = self.next()
             if token.type == TOKEN_TYPE_TEXT:
                 self.extend_list(node_list, TextNode(token.contents), token)
             elif token.type == TOKEN_TYPE_VAR:
-                if not token.contents:
+                contents = token.contents
+                if not contents:
                     raise EmptyVariableTagException(token.lineno)
                 try:
-                    var_node = VariableNode(self.compile_modifier(token.contents, token.lineno))
+                    expression = self.compile_modifier(contents, token.lineno)
                 except (NoSuchVariableException, CharacterParseException, NoAttributeToAccessException) as e:
                     ex = NoSuchVariableException(e.var_name, e.lineno)
                     raise ex
-                self.extend_list(node_list, var_node, token)
+                self.extend_list(node_list, self.fold_constant(expression), token)
             elif token.type == TOKEN_TYPE_BLOCK:
+                contents = token.contents
                 try:
-                    command = token.contents.split()[0]
+                    command = contents.split()[0]
                 except IndexError:
                     raise EmptyBlockTagException('Empty block tag', token.lineno)
                 if command in stop:
                     self.prepend_token(token)
-                    return node_list
+                    return self.merge_text(node_list)
                 self.stack.append((command, token))
                 try:
 
                     f = self.actions[command]
 
                 except KeyError:
-                    raise NoSuchActionException(token.lineno)
+                    raise NoSuchActionException(command, token.lineno)
                 try:
-                    pattern = getattr(f, 'pattern', None)
+                    pattern = self.patterns.get(command)
                     if pattern is not None:
-                        m = re.search(pattern, token.contents)
-                        if m.string != token.contents:
-                            raise WrongPatternForActionException(pattern, token.contents, token.lineno)
-                        c = command + ' '
-                        for i in m.groups():
-                            c += ('\"' + i + '\"' + ' ')
-
-                        token.contents = c
-                    result = f(self, token, token.lineno)
+                        m = pattern.fullmatch(contents)
+                        if m is None:
+                            raise WrongPatternForActionException(pattern.pattern, contents, token.lineno)
+                        # The captured values go to the action as they are
+                        result = f(self, token, token.lineno, groups=m.groups())
+                    else:
+                        result = f(self, token, token.lineno)
                 except Exception as e:
                     raise e
                 self.extend_list(node_list, result, token)
                 self.stack.pop()
         if stop:
             raise UnclosedBlockTagException('Unclosed Block tag', token.lineno)
-        return node_list
+        return self.merge_text(node_list)
+
+    def merge_text(self, node_list):
+        # Consecutive static output (text, folded constants, text around comments) becomes a single node
+        merged = []
+        run = []
+        for node in node_list:
+            if type(node) is TextNode:
+                run.append(node)
+                continue
+            self.flush_text(run, merged)
+            merged.append(node)
+        self.flush_text(run, merged)
+        return merged
+
+    def flush_text(self, run, merged):
+        if len(run) == 1:
+            merged.append(run[0])
+        elif run:
+            text = TextNode(''.join([node.text for node in run]))
+            text.token = run[0].token
+            merged.append(text)
+        del run[:]
+
+    def fold_constant(self, expression):
+        if expression.is_constant():
+            try:
+                return TextNode(str(expression.resolve(None)))
+            except Exception:
+                # Left for the render to report
+                pass
+        return VariableNode(expression)
 
-    def find_modifier(self, name):
+    def find_modifier(self, name, lineno=None):
         if name in self.modifiers:
             return self.modifiers[name]
         else:
-            raise NoSuchModifierException('Bitch')
+            raise NoSuchModifierException(name, lineno)
 
     def compile_modifier(self, expr, lineno):
         return ModifierExpression(expr, lineno, self)
 
     def skip_past(self, endtag):
-        while self.tokens:
+        while self.has_tokens():
             token = self.next()
             if token.type == TOKEN_TYPE_BLOCK and token.contents == endtag:
                 return
@@ -169,64 +432,171 @@ class Parser:
         node.token = token
         nodelist.append(node)
 
+    def has_tokens(self):
+        if self.pushed:
+            return True
+        for token in self.tokens:
+            self.pushed.append(token)
+            return True
+        return False
+
     def next(self):
-        return self.tokens.pop(0)
+        if self.pushed:
+            return self.pushed.pop()
+        return next(self.tokens)
 
     def prepend_token(self, token):
-        self.tokens.insert(0, token)
+        self.pushed.append(token)
 
     def delete_first_token(self):
-        del self.tokens[0]
+        self.next()
+
+    def load_template(self, name):
+        if self.engine is None:
+            raise Exception  # TODO:No engine to load templates
+        template = self.engine.get_template(name)
+        self.dependencies.append(self.engine.file_state(name))
+        self.dependencies.extend(template.dependencies)
+        return template
 
     def add_library(self, lib):
+        # The registry is shared, this parser gets its own copy
+        self.actions = dict(self.actions)
         self.actions.update(lib.actions)
+        self.patterns = patterns_of(self.actions)
+        self.modifiers = dict(self.modifiers)
         self.modifiers.update(lib.modifiers)
 
 
 class Lexer:
-    def __init__(self, string):
+    def __init__(self, string, chunk_size=65536):
+        # Either the source itself, or a file object or mmap which is read lazily
         self.string = string
+        self.chunk_size = chunk_size
 
     def tokenize(self):
-        in_tag = False
+        return list(self.iter_tokens())
+
+    def iter_tokens(self):
+        if isinstance(self.string, str):
+            return self.iter_source_tokens()
+        return self.iter_stream_tokens()
+
+    def iter_source_tokens(self):
+        source = Source(self.string)
+        upto = 0
+        for match in tag_expr_re.finditer(self.string):
+            start, end = match.span()
+            if start > upto:
+                yield Token(TOKEN_TYPE_TEXT, source=source, start=upto, end=start)
+            token_type = self.tag_type(self.string, start)
+            # Comments never reach the parser
+            if token_type != TOKEN_TYPE_COMMENT:
+                yield Token(token_type, source=source, start=start, end=end)
+            upto = end
+        if upto < len(self.string):
+            yield Token(TOKEN_TYPE_TEXT, source=source, start=upto, end=len(self.string))
+
+    def iter_stream_tokens(self):
+        decoder = None
+        pending = ''
         lineno = 1
-        result = []
-        for bit in tag_expr_re.split(self.string):
-            if bit:
-                result.append(self.create_token(lineno, bit, in_tag))
-            in_tag = not in_tag
-            lineno += bit.count('\n')
-        return result
-
-    def create_token(self, lineno, token_string, in_tag):
-        if in_tag:
-            if token_string.startswith(BLOCK_TAG_START):
-                block = token_string[2:-2].strip()
-                token = Token(TOKEN_TYPE_BLOCK, block, lineno)
-            elif token_string.startswith(VARIABLE_TAG_START):
-                token = Token(TOKEN_TYPE_VAR, token_string[2:-2].strip(), lineno)
-            elif token_string.startswith(COMMENT_TAG_START):
-                token = Token(TOKEN_TYPE_COMMENT, token_string[2:-2].strip(), lineno)
-        else:
-            token = Token(TOKEN_TYPE_TEXT, token_string, lineno)
-        return token
+        while True:
+            data = self.string.read(self.chunk_size)
+            eof = not data
+            if isinstance(data, bytes):
+                if decoder is None:
+                    decoder = codecs.getincrementaldecoder('utf-8')()
+                data = decoder.decode(data, eof)
+            pending += data
+            if eof:
+                text, pending = pending, ''
+            else:
+                # Tags never span lines, everything up to the last newline can be tokenized
+                cut = pending.rfind('\n') + 1
+                if not cut:
+                    continue
+                text, pending = pending[:cut], pending[cut:]
+            yield from self.split_tokens(text, lineno)
+            lineno += text.count('\n')
+            if eof:
+                return
+
+    def split_tokens(self, text, lineno):
+        # Tokens holding their own contents, so the text they come from can be freed
+        upto = 0
+        for match in tag_expr_re.finditer(text):
+            start, end = match.span()
+            if start > upto:
+                yield Token(TOKEN_TYPE_TEXT, text[upto:start], lineno)
+                lineno += text.count('\n', upto, start)
+            token_type = self.tag_type(text, start)
+            if token_type != TOKEN_TYPE_COMMENT:
+                yield Token(token_type, text[start + 2:end - 2].strip(), lineno)
+            upto = end
+        if upto < len(text):
+            yield Token(TOKEN_TYPE_TEXT, text[upto:], lineno)
+
+    def tag_type(self, text, start):
+        if text.startswith(BLOCK_TAG_START, start):
+            return TOKEN_TYPE_BLOCK
+        elif text.startswith(VARIABLE_TAG_START, start):
+            return TOKEN_TYPE_VAR
+        return TOKEN_TYPE_COMMENT
+
+
+class Source:
+    __slots__ = ('text', 'newlines')
+
+    def __init__(self, text):
+        self.text = text
+        self.newlines = None
+
+    def lineno(self, position):
+        # The offsets of the newlines are only collected the first time a line number is needed
+        if self.newlines is None:
+            self.newlines = array('q', [match.start() for match in newline_re.finditer(self.text)])
+        return bisect_left(self.newlines, position) + 1
 
 
 class Token:
-    def __init__(self, type, contents, lineno):
+    # Tokens made by the lexer only hold offsets into their source, contents and line numbers are computed on demand
+    __slots__ = ('type', 'source', 'start', 'end', '_contents', '_lineno')
+
+    def __init__(self, type, contents=None, lineno=None, source=None, start=0, end=0):
         self.type = type
-        self.contents = contents
-        self.lineno = lineno
+        self.source = source
+        self.start = start
+        self.end = end
+        self._contents = contents
+        self._lineno = lineno
+
+    def __reduce__(self):
+        return self.__class__, (self.type, self.contents, self.lineno)
+
+    @property
+    def contents(self):
+        if self._contents is not None:
+            return self._contents
+        if self.type == TOKEN_TYPE_TEXT:
+            return self.source.text[self.start:self.end]
+        return self.source.text[self.start + 2:self.end - 2].strip()
+
+    @contents.setter
+    def contents(self, contents):
+        self._contents = contents
+
+    @property
+    def lineno(self):
+        if self._lineno is None:
+            self._lineno = self.source.lineno(self.start)
+        return self._lineno
 
     def __repr__(self):
         return '<Token - {}: {}... at line {}>'.format(TOKEN_MAP[self.type], self.contents[:20], self.lineno)
 
     def split(self):
-        s = []
-        splited = split(self.contents)
-        for bit in splited:
-            s.append(bit)
-        return s
+        return list(split(self.contents))
 
 
 class Variable:
@@ -250,6 +620,14 @@ class Variable:
                 self.literal = var[1:-1].replace(r'\%s' % quote, quote).replace(r'\\', '\\')
             except ValueError:
                 self.lookups = tuple(var.split(VARIABLE_ATTRIBUTE_SEPERATOR))
+        # Per segment, the type last seen there and the way it was accessed
+        self.accessors = None if self.lookups is None else [None] * len(self.lookups)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.lookups is not None:
+            state['accessors'] = [None] * len(self.lookups)
+        return state
 
     def _resolve(self, context):
         if self.lookups is not None:
@@ -266,42 +644,84 @@ class Variable:
 
     def _lookup(self, context):
         curr = context
+        for i, var in enumerate(self.lookups):
+            curr = self._step(curr, var, i)
+        if callable(curr):
+            curr = call_value(curr, context)
+        return curr
 
-        try:
-            for var in self.lookups:
-
-                try:
-
-                    curr = curr[var]
-
-                except (TypeError, KeyError, IndexError, AttributeError, ValueError):
-                    try:
-
-                        curr = getattr(curr, var)
-                    except (TypeError, AttributeError):
-                        try:
+    async def resolve_async(self, context):
+        if self.lookups is None:
+            return self.literal
+        curr = context
+        for i, var in enumerate(self.lookups):
+            if isawaitable(curr):
+                curr = await context.wait(curr)
+            curr = self._step(curr, var, i)
+        if isawaitable(curr):
+            curr = await context.wait(curr)
+        if callable(curr):
+            curr = call_value(curr, context)
+            if isawaitable(curr):
+                curr = await curr
+        return curr
 
-                            curr = curr[int(var)]
+    def _step(self, curr, var, i):
+        # One segment of the lookup, shared by the sync and async paths
+        accessor = self.accessors[i]
+        if accessor is not None and accessor[0] is type(curr):
+            try:
+                if accessor[1] == LOOKUP_ITEM:
+                    return curr[var]
+                elif accessor[1] == LOOKUP_ATTRIBUTE:
+                    return getattr(curr, var)
+                return curr[int(var)]
+            except (TypeError, KeyError, IndexError, AttributeError, ValueError):
+                pass
+        return self._probe(curr, var, i)
+
+    def _probe(self, curr, var, i):
+        # Tries an item, an attribute and an index in turn, and remembers which one worked for this type.
+        # Attributes and indexes are only remembered when an item lookup can never succeed, so the
+        # order of precedence stays the same.
+        kind = type(curr)
+        try:
+            curr = curr[var]
+            self.accessors[i] = (kind, LOOKUP_ITEM)
+            return curr
+        except TypeError:
+            item_possible = False
+        except (KeyError, IndexError, AttributeError, ValueError):
+            item_possible = hasattr(kind, '__getitem__')
+        try:
+            curr = getattr(curr, var)
+            if not item_possible:
+                self.accessors[i] = (kind, LOOKUP_ATTRIBUTE)
+            return curr
+        except (TypeError, AttributeError):
+            pass
+        try:
+            curr = curr[int(var)]
+            if not item_possible:
+                self.accessors[i] = (kind, LOOKUP_INDEX)
+            return curr
+        except (IndexError, ValueError, TypeError, KeyError):
+            raise NoSuchVariableException(var, self.lineno)
 
-                        except (IndexError, ValueError, TypeError, KeyError):
 
-                            raise NoSuchVariableException(var, self.lineno)
-            if callable(curr):
-                if getattr(curr, 'call_not_allowed', False):
-                    pass
-                elif getattr(curr, 'alters_data', False):
-                    curr = context.engine.string_if_invalid
-                else:
-                    try:
-                        curr = curr()
-                    except TypeError:
-                        try:
-                            getcallargs(curr)
-                        except TypeError:
-                            curr = "Invalid method call"
-        except Exception as e:
-            raise
-        return curr
+def call_value(value, context):
+    if getattr(value, 'call_not_allowed', False):
+        return value
+    if getattr(value, 'alters_data', False):
+        return context.engine.string_if_invalid
+    try:
+        return value()
+    except TypeError:
+        try:
+            getcallargs(value)
+        except TypeError:
+            return "Invalid method call"
+    return value
 
 
 constant_string = r"""
@@ -366,8 +786,8 @@ class ModifierExpression:
                     args.append((False, Variable(constant_arg, self.lineno).resolve({})))
                 elif var_arg:
                     args.append((True, Variable(var_arg, self.lineno)))
-                modifier_func = parser.find_modifier(modifier_name)
-                self.args_check(modifier_name, modifier_func, args)
+                modifier_func = parser.find_modifier(modifier_name, self.lineno)
+                self.args_check(modifier_name, modifier_func, args, parser.registry)
                 modifiers.append((modifier_func, args))
             upto = match.end()
         if upto != len(token):
@@ -375,6 +795,29 @@ class ModifierExpression:
 
         self.modifiers = modifiers
         self.var = var_obj
+        # Results of pure modifiers by input, only used when one of them is pure
+        self.memo = {} if any(getattr(func, 'pure', False) for func, _ in modifiers) else None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.memo is not None:
+            state['memo'] = {}
+        return state
+
+    def variables(self):
+        # The lookups of the expression, its input and its arguments
+        candidates = [self.var] + [arg for _, args in self.modifiers for lookup, arg in args if lookup]
+        return [var for var in candidates if isinstance(var, Variable) and var.lookups is not None]
+
+    def names(self):
+        return {var.lookups[0] for var in self.variables()}
+
+    def is_constant(self):
+        # Constant input and pure modifiers with constant arguments always give the same output
+        if isinstance(self.var, Variable) and self.var.lookups is not None:
+            return False
+        return all(getattr(func, 'pure', False) and not iscoroutinefunction(func) and
+                   not any(lookup for lookup, _ in args) for func, args in self.modifiers)
 
     def resolve(self, context, ignore_failures=False):
         if isinstance(self.var, Variable):
@@ -396,8 +839,11 @@ class ModifierExpression:
                         obj = string_if_invalid
         else:
             obj = self.var
+        return self.apply_modifiers(obj, context)
 
-        for func, args in self.modifiers:
+    def apply_modifiers(self, obj, context):
+        memo = self.memo
+        for i, (func, args) in enumerate(self.modifiers):
             arg_vals = []
 
             for lookup, arg in args:
@@ -405,19 +851,80 @@ class ModifierExpression:
                     arg_vals.append(arg)
                 else:
                     arg_vals.append(arg.resolve(context))
-            obj = func(obj, *arg_vals)
+            if memo is None or not getattr(func, 'pure', False):
+                obj = func(obj, *arg_vals)
+                continue
+            try:
+                key = (i, type(obj), obj) + tuple(arg_vals)
+                result = memo[key]
+            except TypeError:
+                # Unhashable input
+                obj = func(obj, *arg_vals)
+                continue
+            except KeyError:
+                result = func(obj, *arg_vals)
+                if len(memo) >= MODIFIER_MEMO_SIZE:
+                    memo.clear()
+                memo[key] = result
+            obj = result
+        return obj
+
+    async def resolve_async(self, context, ignore_failures=False):
+        if isinstance(self.var, Variable):
+            try:
+                obj = await self.var.resolve_async(context)
+            except NoSuchVariableException:
+                if ignore_failures:
+                    obj = None
+                else:
+                    raise
+        else:
+            obj = self.var
+        return await self.apply_modifiers_async(obj, context)
+
+    async def apply_modifiers_async(self, obj, context):
+        # Modifiers may be coroutine functions, the memo keeps what they returned once awaited
+        memo = self.memo
+        for i, (func, args) in enumerate(self.modifiers):
+            arg_vals = []
+            for lookup, arg in args:
+                if not lookup:
+                    arg_vals.append(arg)
+                else:
+                    arg_vals.append(await arg.resolve_async(context))
+            key = None
+            if memo is not None and getattr(func, 'pure', False):
+                try:
+                    key = (i, type(obj), obj) + tuple(arg_vals)
+                    obj = memo[key]
+                    continue
+                except TypeError:
+                    key = None
+                except KeyError:
+                    pass
+            result = func(obj, *arg_vals)
+            if isawaitable(result):
+                result = await result
+            if key is not None:
+                if len(memo) >= MODIFIER_MEMO_SIZE:
+                    memo.clear()
+                memo[key] = result
+            obj = result
         return obj
 
-    def args_check(name, func, provided):
+    def args_check(name, func, provided, registry=None):
         provided = list(provided)
         # First argument, modifier input, is implied.
         plen = len(provided) + 1
-        # Check to see if a decorator is providing the real function.
-        func = getattr(func, '_decorated_function', func)
+        if registry is not None:
+            alen, dlen = registry.arity(func)
+        else:
+            # Check to see if a decorator is providing the real function.
+            func = getattr(func, '_decorated_function', func)
 
-        args, _, _, defaults, _, _, _ = getfullargspec(func)
-        alen = len(args)
-        dlen = len(defaults or [])
+            args, _, _, defaults, _, _, _ = getfullargspec(func)
+            alen = len(args)
+            dlen = len(defaults or [])
         # Not enough OR Too many
         if plen < (alen - dlen) or plen > alen:
             raise Exception  # TODO: Less or too many arguments
@@ -430,8 +937,26 @@ class ModifierExpression:
         return self.token
 
 
+class Literal:
+    # An argument known once parsed, like the values captured by the pattern of a pattern action
+    def __init__(self, value):
+        self.value = value
+
+    def resolve(self, context, ignore_failures=False):
+        return self.value
+
+    async def resolve_async(self, context, ignore_failures=False):
+        return self.value
+
+    def variables(self):
+        return []
+
+    def __str__(self):
+        return str(self.value)
+
+
 def parse_args(lineno, parser, bits, params, varargs, varkw, defaults, kwonly, kwonly_defaults,
-               need_context, name, is_loop=False):
+               need_context, name, is_loop=False, literal=False):
     if params[0] == 'node_id':
         params = params[1:]
     else:
@@ -457,7 +982,7 @@ def parse_args(lineno, parser, bits, params, varargs, varkw, defaults, kwonly, k
 
     for bit in bits:
         # First we try to extract a potential kwarg from the bit
-        kwarg = token_kwargs([bit], parser)
+        kwarg = {} if literal else token_kwargs([bit], parser)
         if kwarg:
             # The kwarg was successfully extracted
             param, value = kwarg.popitem()
@@ -482,7 +1007,7 @@ def parse_args(lineno, parser, bits, params, varargs, varkw, defaults, kwonly, k
                 raise Exception  # TODO:Positional args after keywords
             else:
                 # Record the positional argument
-                args.append(parser.compile_modifier(bit, lineno))
+                args.append(Literal(bit) if literal else parser.compile_modifier(bit, lineno))
                 try:
                     # Consume from the list of expected positional arguments
                     unhandled_params.pop(0)
@@ -0,0 +1,67 @@
+import argparse
+import json
+import sys
+import tracemalloc
+from timeit import Timer
+
+from benchmarks.scenarios import scenarios
+
+
+def measure(name, min_time):
+    func = scenarios[name]()
+    timer = Timer(func)
+    number, elapsed = timer.autorange()
+    while elapsed < min_time:
+        number *= 2
+        elapsed = timer.timeit(number)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'ops_per_sec': number / elapsed, 'peak_memory': peak}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Strana benchmark suite')
+    parser.add_argument('names', nargs='*', help='scenarios to run, all of them by default')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare the results against this baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown or memory growth reported as a regression')
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds to spend timing every scenario')
+    args = parser.parse_args(argv)
+
+    names = args.names or sorted(scenarios)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    for name in names:
+        result = measure(name, args.min_time)
+        results[name] = result
+        line = '{:<24} {:>12.1f} ops/sec {:>12.1f} KiB peak'.format(
+            name, result['ops_per_sec'], result['peak_memory'] / 1024)
+        base = baseline.get(name)
+        if base is not None:
+            speed = result['ops_per_sec'] / base['ops_per_sec'] - 1
+            memory = result['peak_memory'] / max(base['peak_memory'], 1) - 1
+            line += ' {:>+7.1%} speed {:>+7.1%} memory'.format(speed, memory)
+            if speed < -args.threshold or memory > args.threshold:
+                regressions.append(name)
+                line += '  REGRESSION'
+        print(line)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if regressions:
+        print('Regressions: ' + ', '.join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+from Strana.builtin import builtin
+from Strana.context import Context
+from Strana.library import Library
+from Strana.template import Lexer, Parser, Template
+
+scenarios = {}
+
+bench = Library()
+
+
+@bench.register_modifier(name='up')
+def up(value, first=False):
+    return value.title() if first else value.upper()
+
+
+@bench.register_modifier(name='low')
+def low(value):
+    return value.lower()
+
+
+@bench.register_modifier(name='wrap')
+def wrap(value, char='*'):
+    return char + value + char
+
+
+LIBRARIES = [builtin, bench]
+
+
+def scenario(name):
+    def dec(func):
+        scenarios[name] = func
+        return func
+
+    return dec
+
+
+def page_source(rows=200):
+    return ''.join('<tr><td>{= row.name =}</td>{# comment #}<td>{> do 2 times <}{= iteration =}{> /do <}</td></tr>\n'
+                   for _ in range(rows))
+
+
+class Node:
+    def __init__(self, depth):
+        self.child = Node(depth - 1) if depth else None
+        self.value = 'leaf'
+
+
+@scenario('lex')
+def lex():
+    source = page_source()
+    return lambda: Lexer(source).tokenize()
+
+
+@scenario('parse')
+def parse():
+    tokens = Lexer(page_source()).tokenize()
+    return lambda: Parser(tokens, LIBRARIES).parse()
+
+
+@scenario('render_deep_lookup')
+def render_deep_lookup():
+    path = '.'.join(['tree'] + ['child'] * 10 + ['value'])
+    t = Template(('{= ' + path + ' =} ') * 50, None, LIBRARIES)
+    context = Context(None, {'tree': Node(10)}, 'root')
+    return lambda: t.render(context)
+
+
+@scenario('render_modifier_chain')
+def render_modifier_chain():
+    chain = '>>'.join(['name'] + ['up', 'low', 'wrap=>"-"'] * 5)
+    t = Template(('{= ' + chain + ' =} ') * 50, None, LIBRARIES)
+    context = Context(None, {'name': 'strana'}, 'root')
+    return lambda: t.render(context)
+
+
+@scenario('render_nested_loops')
+def render_nested_loops():
+    t = Template('{> for row in rows <}{> for cell in row <}{> do 2 times <}{= cell =}{= iteration =}'
+                 '{> /do <}{> /for <}\n{> /for <}', None, LIBRARIES)
+    context = Context(None, {'rows': [list(range(50)) for _ in range(50)]}, 'root')
+    return lambda: t.render(context)
+
+
+@scenario('render_large_context')
+def render_large_context():
+    t = Template('{> for i in items <}{= name =}{= i =}{> /for <}', None, LIBRARIES)
+    context = Context(None, {'items': list(range(1000)), 'name': 'x'}, 'root')
+    context.context.push({'key_{}'.format(i): i for i in range(10000)}, 'big')
+    for level in range(50):
+        context = context.push_temporary({'level_{}'.format(level): level}, 'level_{}'.format(level))
+    return lambda: t.render(context)
+
+
+@scenario('render_compiled')
+def render_compiled():
+    t = Template(page_source(), None, LIBRARIES, compiled=True)
+    context = Context(None, {'row': {'name': 'strana'}}, 'root')
+    return lambda: t.render(context)
+
+
+@scenario('parse_50k_nodes')
+def parse_50k_nodes():
+    # 10k lines of five nodes each, counting the bodies of the loops
+    source = 'Text {= row.name =} more {> do 2 times <}{= iteration =}{> /do <}\n' * 10000
+    return lambda: Template(source, None, LIBRARIES)
+
+
+@scenario('render_commented')
+def render_commented():
+    # Mostly markup and comments, which the parser collapses into few text nodes
+    source = '<li>{# item #}text{# note #}</li>{= "x" =}\n{# section #}' * 2000
+    t = Template(source, None, LIBRARIES)
+    context = Context(None, {}, 'root')
+    return lambda: t.render(context)
+
+
+@scenario('compile_small')
+def compile_small():
+    # Many small ad-hoc templates, dominated by the setup of every parse
+    source = '<p>{= user.name>>up =}</p>{> for i in items <}{= i>>wrap =}{> /for <}'
+    return lambda: Template(source, None, LIBRARIES)
@@ -0,0 +1,25 @@
+from timeit import timeit
+
+from Strana.context import Context
+from Strana.template import Variable
+
+
+class User:
+    def __init__(self, name):
+        self.name = name
+        self.tags = ['admin', 'staff']
+
+
+v = Variable('user.name', 1)
+index = Variable('user.tags.1', 1)
+for user in (User('a'), User('b'), {'name': 'c', 'tags': ['x', 'y']}):
+    c = Context(None, {'user': user}, 'root')
+    print(v.resolve(c), index.resolve(c), v.accessors)
+
+# An item always takes precedence over an attribute, even after an attribute was used for the same type
+items = Variable('d.items', 1)
+print(items.resolve(Context(None, {'d': {}}, 'root')))
+print(items.resolve(Context(None, {'d': {'items': 'key'}}, 'root')))
+
+c = Context(None, {'user': User('a')}, 'root')
+print('{:.3f} us per lookup'.format(timeit(lambda: index.resolve(c), number=100000) * 10))
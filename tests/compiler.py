@@ -0,0 +1,41 @@
+from Strana.builtin import builtin
+from Strana.context import Context
+from Strana.library import Library
+from Strana.node import TextNode
+from Strana.template import Template
+
+r = Library()
+
+
+@r.register_modifier(name='up')
+def up(value, first=False):
+    return value.title() if first else value.upper()
+
+
+source = """<h1>{= title>>up =}</h1>
+{> do 2 times <}
+    <p>{= user.name>>up=>True =} #{= iteration =} {= "const">>up =}</p>
+    {> for i in items <}<i>{= i =}</i>{> /for <}
+{> /do <}
+"""
+data = {'title': 'compiled', 'user': {'name': 'aniket'}, 'items': [1, 2, 3]}
+interpreted = Template(source, None, [r, builtin])
+compiled = Template(source, None, [r, builtin], compiled=True)
+print(compiled.compiled.source)
+print(compiled.render(Context(None, data, 'root')))
+assert compiled.render(Context(None, data, 'root')) == interpreted.render(Context(None, data, 'root'))
+assert ''.join(compiled.stream(Context(None, data, 'root'))) == interpreted.render(Context(None, data, 'root'))
+
+# Custom loop actions keep their own body when compiled
+
+texts = Library()
+
+
+@texts.loop_action(name='texts')
+def texts_action(node_id, body):
+    return ','.join(n.text for n in body if isinstance(n, TextNode))
+
+
+for compiled in (False, True):
+    t = Template('{> texts <}a{= x =}b{> /texts <}', None, [builtin, texts], compiled)
+    assert t.render(Context(None, {'x': 1}, 'root')) == 'a,b'
@@ -0,0 +1,17 @@
+from timeit import timeit
+
+from Strana.context import Context
+
+NUMBER = 200000
+
+for depth in (1, 10, 100, 1000):
+    c = Context(None, {'root_var': 1, 'items': list(range(10000))}, 'root')
+    for level in range(depth):
+        c = c.push_temporary({'level_{}'.format(level): level}, 'node_{}'.format(level))
+    local_var = 'level_{}'.format(depth - 1)
+    root = timeit(lambda: c['root_var'], number=NUMBER)
+    local = timeit(lambda: c[local_var], number=NUMBER)
+    # A loop iteration: fresh scope, then a lookup of a name from the root context
+    iteration = timeit(lambda: c.push_temporary({'i': 0}, 'loop')['root_var'], number=NUMBER // 10)
+    print('depth {:>4}: root lookup {:.3f} us, local lookup {:.3f} us, fresh scope + root lookup {:.3f} us'.format(
+        depth, root / NUMBER * 1e6, local / NUMBER * 1e6, iteration / (NUMBER // 10) * 1e6))
@@ -0,0 +1,41 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from Strana.context import Context
+from Strana.engine import DefaultEngine
+from Strana.template import Template
+
+templates = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+cache_dir = tempfile.mkdtemp()
+try:
+    if len(sys.argv) > 1:
+        cache_dir = sys.argv[1]
+    engine = DefaultEngine(templates, cache_dir=cache_dir)
+    t = engine.get_template('test')
+    print(os.listdir(cache_dir))
+    print(t.render(Context(engine, {'title': 'From cache', 'l': [1, 2]}, 'root')))
+    if len(sys.argv) == 1:
+        # A fresh process loads the nodes stored by this one
+        subprocess.check_call([sys.executable, __file__, cache_dir])
+finally:
+    if len(sys.argv) == 1:
+        shutil.rmtree(cache_dir)
+
+if len(sys.argv) == 1:
+    # Engines sharing a cache directory include the templates of their own path
+    root = tempfile.mkdtemp()
+    try:
+        engines = []
+        for name in ('a', 'b'):
+            os.mkdir(os.path.join(root, name))
+            with open(os.path.join(root, name, 'header.ptm'), 'w') as f:
+                f.write('HEADER ' + name.upper())
+            engines.append(DefaultEngine(os.path.join(root, name), cache_dir=os.path.join(root, 'cache')))
+        for engine, expected in zip(engines, ('HEADER A', 'HEADER B')):
+            rendered = Template('{> include "header" <}', engine).render(Context(engine, {}, 'root'))
+            assert rendered == expected, rendered
+    finally:
+        shutil.rmtree(root)
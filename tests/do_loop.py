@@ -0,0 +1,39 @@
+import asyncio
+
+from Strana.builtin import builtin
+from Strana.context import Context
+from Strana.library import Library
+from Strana.template import Template
+
+r = Library()
+
+
+@r.basic_action(name='label', need_context=False)
+def label(node_id, value):
+    return 'n{}'.format(value)
+
+
+class Counter:
+    def __init__(self):
+        self.count = -1
+
+    def next(self):
+        self.count += 1
+        return self.count
+
+
+source = ('{> do 3 times <}<{= "a" =}>{> /do <}|{> do 3 times <}{= counter.next =}{> /do <}|'
+          '{> do 3 times <}{= iteration =}{> do 2 times <}{= iteration =}{> /do <};{> /do <}|'
+          '{> do 2 times <}{> label iteration as n <}{= n =}{> /do <}|{> do 0 times <}x{> /do <}')
+for compiled in (False, True):
+    t = Template(source, None, [builtin, r], compiled)
+    # The first body is rendered once and repeated
+    print([(type(node).__name__, getattr(node, 'repeat', None), getattr(node, 'scoped', None)) for node in t.node_list])
+    expected = '<a><a><a>|012|001;101;201;|n0n1|'
+    assert t.render(Context(None, {'counter': Counter()}, 'root')) == expected
+    assert ''.join(t.stream(Context(None, {'counter': Counter()}, 'root'))) == expected
+    assert asyncio.run(t.render_async(Context(None, {'counter': Counter()}, 'root'))) == expected
+    # Repeated bodies are streamed one iteration at a time
+    repeated = Template('{> do 3 times <}ab{> /do <}', None, [builtin], compiled)
+    assert list(repeated.stream(Context(None, {}, 'root'))) == ['ab'] * 3
+print(expected)
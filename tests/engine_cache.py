@@ -0,0 +1,29 @@
+import os
+import shutil
+import tempfile
+import time
+
+from Strana.context import Context
+from Strana.engine import DefaultEngine
+
+path = tempfile.mkdtemp()
+try:
+    shutil.copy(os.path.join(os.path.dirname(__file__), 'templates', 'test.ptm'), path)
+    engine = DefaultEngine(path, cache_size=2)
+    t = engine.get_template('test')
+    assert engine.get_template('test') is t
+    print(t.render(Context(engine, {'title': 'Cached', 'l': [1, 2]}, 'root')))
+
+    time.sleep(0.01)
+    with open(os.path.join(path, 'test.ptm'), 'w') as f:
+        f.write('Reloaded {= title =}')
+    reloaded = engine.get_template('test')
+    assert reloaded is not t
+    print(reloaded.render(Context(engine, {'title': 'Cached'}, 'root')))
+
+    production = DefaultEngine(path, auto_reload=False)
+    t = production.get_template('test')
+    os.remove(os.path.join(path, 'test.ptm'))
+    assert production.get_template('test') is t
+finally:
+    shutil.rmtree(path)
@@ -0,0 +1,61 @@
+import asyncio
+import tracemalloc
+
+from Strana.builtin import builtin
+from Strana.context import Context
+from Strana.exception import UnpackException
+from Strana.library import Library
+from Strana.template import Template
+
+r = Library()
+
+
+@r.register_modifier(name='pairs')
+def pairs(value):
+    return value.items()
+
+
+class Shop:
+    def __init__(self):
+        self.stock = {'apple': 3, 'pear': 0}
+
+    def products(self):
+        return iter(['a', 'b', 'c'])
+
+
+source = ('{> for name, count in shop.stock>>pairs <}{= name =}={= count =} {> /for <}\n'
+          '{> for p in shop.products <}{= loop.index =}{= p =}{= loop.first =}{= loop.last =} {> /for <}\n'
+          '{> for x in empty <}never{> /for <}')
+for compiled in (False, True):
+    t = Template(source, None, [builtin, r], compiled)
+    output = t.render(Context(None, {'shop': Shop(), 'empty': []}, 'root'))
+    print(output)
+    assert output == 'apple=3 pear=0 \n0aTrueFalse 1bFalseFalse 2cFalseTrue \n'
+
+for items in ([(1, 2, 3)], [5]):
+    try:
+        Template('{> for a, b in items <}{> /for <}', None, [builtin]).render(Context(None, {'items': items}, 'root'))
+    except UnpackException as e:
+        print(e)
+    else:
+        raise AssertionError('{} was unpacked into two names'.format(items))
+
+# A generator of a million rows streams with the memory of one row
+rows = ({'id': i} for i in range(1000000))
+t = Template('{> for row in rows <}<tr>{= row.id =}</tr>{> /for <}', None, [builtin])
+tracemalloc.start()
+size = 0
+for chunk in t.stream(Context(None, {'rows': rows}, 'root')):
+    size += len(chunk)
+peak = tracemalloc.get_traced_memory()[1]
+tracemalloc.stop()
+print(size, '{:.1f} KiB peak'.format(peak / 1024))
+assert peak < 1024 * 1024
+
+
+async def numbers():
+    return range(3)
+
+
+t = Template('{> for n in numbers <}{= n =}{> /for <}', None, [builtin])
+assert asyncio.run(t.render_async(Context(None, {'numbers': numbers()}, 'root'))) == '012'
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import time
+
+from Strana.cache import FileFragmentCache, MemoryFragmentCache
+from Strana.context import Context
+from Strana.engine import DefaultEngine
+from Strana.template import Template
+
+calls = []
+
+
+def expensive():
+    calls.append(1)
+    return len(calls)
+
+
+source = '{> cache "catalog" 60 user <}rendered {= expensive =} for {= user =}{> /cache <}'
+engine = DefaultEngine()
+t = Template(source, engine)
+for user in ('a', 'a', 'b', 'a'):
+    print(t.render(Context(engine, {'expensive': expensive, 'user': user}, 'root')))
+assert len(calls) == 2
+
+cache = MemoryFragmentCache(max_bytes=10, default_timeout=0.05)
+cache.set('x', '12345')
+cache.set('y', '12345')
+cache.set('z', '1')
+assert cache.get('x') is None and cache.get('y') == '12345'
+time.sleep(0.1)
+assert cache.get('y') is None
+
+path = tempfile.mkdtemp()
+try:
+    engine = DefaultEngine(fragment_cache=FileFragmentCache(path))
+    t = Template(source, engine)
+    print(t.render(Context(engine, {'expensive': expensive, 'user': 'c'}, 'root')))
+    print(Template(source, DefaultEngine(fragment_cache=FileFragmentCache(path))).render(
+        Context(engine, {'expensive': expensive, 'user': 'c'}, 'root')))
+    assert len(calls) == 3
+    files = FileFragmentCache(path, default_timeout=0.05)
+    # Fragments come back exactly as rendered, line endings included
+    files.set('lines', 'a\r\nb\rc\n')
+    assert files.get('lines') == 'a\r\nb\rc\n'
+    files.set('x', 'stale')
+    assert files.get('x') == 'stale'
+    time.sleep(0.1)
+    assert files.get('x') is None and not os.path.exists(files.path('x'))
+    assert files.get('x') is None
+finally:
+    shutil.rmtree(path)
@@ -0,0 +1,32 @@
+import os
+from itertools import count
+
+from Strana.context import Context
+from Strana.engine import DefaultEngine
+from Strana.library import Library
+
+templates = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+for compiled in (False, True):
+    engine = DefaultEngine(templates, compiled=compiled)
+    page = engine.get_template('page')
+    print(page.render(Context(engine, {'site': 'Strana', 'title': 'Page', 'items': [1, 2]}, 'root')))
+    # The parent is parsed once and shared with every child through the engine cache
+    assert engine.get_template('base') is engine.get_template('base')
+    print(engine.get_template('base').render(Context(engine, {'site': 'Strana'}, 'root')))
+
+# Loops of the parent get the blocks of the child, stored variables start afresh every iteration
+r = Library()
+counter = count()
+
+
+@r.basic_action(name='next', need_context=False)
+def next_value(node_id):
+    return next(counter)
+
+
+engine = DefaultEngine(templates)
+engine.libraries.append(r)
+context = Context(engine, {'v': '-'}, 'root')
+output = engine.get_template('repeat_page').render(context)
+print(output)
+assert output == '-0;-1;\n'
@@ -0,0 +1,15 @@
+from Strana.builtin import builtin
+from Strana.context import Context
+from Strana.template import Template
+
+source = 'a{# one #}b{= "c" =}d{> do 2 times <}e{# two #}f{= iteration =}{> /do <}g{# three #}\n'
+for compiled in (False, True):
+    t = Template(source, None, [builtin], compiled)
+    print(t.node_list)
+    print(repr(t.render(Context(None, {}, 'root'))))
+    assert t.render(Context(None, {}, 'root')) == 'abcdef0ef1g\n'
+
+t = Template(source * 1000, None, [builtin])
+# Text between the loops (across line breaks) collapses into one node
+print(len(t.node_list))
+assert len(t.node_list) == 2001
@@ -0,0 +1,14 @@
+from timeit import default_timer
+
+from Strana.builtin import builtin
+from Strana.template import Lexer, Parser
+
+chunk = 'Row {= row.name =} {> do 2 times <}{= iteration =}{> /do <}\n'
+# Every chunk holds three tags, a variable and an opening and closing block
+for tags in (1000, 10000, 100000):
+    source = chunk * (tags // 3)
+    tokens = Lexer(source).tokenize()
+    start = default_timer()
+    Parser(tokens, [builtin]).parse()
+    elapsed = default_timer() - start
+    print('{:>6} tags: {:.3f} s, {:.2f} us per tag'.format(tags, elapsed, elapsed / tags * 1e6))
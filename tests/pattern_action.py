@@ -0,0 +1,42 @@
+import timeit
+
+from Strana.builtin import builtin
+from Strana.context import Context
+from Strana.exception import WrongPatternForActionException
+from Strana.library import Library
+from Strana.template import Lexer, Parser, Template
+
+r = Library()
+
+
+@r.pattern_action(name='repeat', pattern='repeat <> by <>', need_body=True, need_context=True)
+def repeat(node_id, body, context, word, count):
+    return ''.join(str(node.render(context)) for node in body) * int(count) + word
+
+
+@r.pattern_action(name='greet', pattern='greet <>')
+def greet(node_id, name):
+    return 'hello ' + name
+
+
+for i in range(50):
+    r.pattern_action(lambda node_id, value: value, name='noop{}'.format(i), pattern='noop{} <>'.format(i))
+
+source = '{> greet world <} {> repeat end by 3 <}x{> /repeat <}'
+tokens = Lexer(source).tokenize()
+contents = [token.contents for token in tokens]
+nodes = Parser(tokens, [builtin, r]).parse()
+# Tokens are left as they were, the captured values go straight to the actions
+assert [token.contents for token in tokens] == contents
+print(nodes[0].args[0].value, [arg.value for arg in nodes[2].args])
+output = Template(source, None, [builtin, r]).render(Context(None, {}, 'root'))
+print(output)
+assert output == 'hello world xxxend'
+
+try:
+    Template('{> greet two words <}', None, [builtin, r])
+except WrongPatternForActionException as e:
+    print(e)
+
+tokens = Lexer(' '.join('{{> noop{} v <}}'.format(i % 50) for i in range(2000))).tokenize()
+print('{:.2f} ms per parse'.format(timeit.timeit(lambda: Parser(tokens, [builtin, r]).parse(), number=20) / 20 * 1e3))
@@ -0,0 +1,40 @@
+import json
+import os
+import time
+
+from Strana.context import Context
+from Strana.engine import DefaultEngine
+from Strana.library import Library
+from Strana.profile import Profiler
+from Strana.builtin import builtin
+from Strana.template import Template
+
+r = Library()
+
+
+@r.register_modifier(name='slow')
+def slow(value):
+    time.sleep(0.002)
+    return value
+
+
+templates = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+profiler = Profiler()
+engine = DefaultEngine(templates, compiled=True, profiler=profiler)
+engine.libraries.append(r)
+page = engine.get_template('page')
+for _ in range(3):
+    output = page.render(Context(engine, {'site': 'Strana', 'title': 'Page', 'items': [1, 2]}, 'root'))
+print(profiler.report(limit=8))
+# Blocks are reported against the template that defines them
+assert any(stats.template == 'page' and stats.kind == 'ForNode' for stats in profiler.entries())
+
+profiler = Profiler()
+source = 'fast {= name =}\n{> for i in items <}{= i>>slow =}{> /for <}'
+t = Template(source, None, [builtin, r])
+assert t.render(Context(None, {'name': 'x', 'items': [1, 2]}, 'root'), profiler=profiler) == 'fast x\n12'
+print(profiler.report(sort='self'))
+hottest = json.loads(profiler.as_json(sort='self'))[0]
+print(hottest)
+# The loop only counts its own work, the time spent in the slow modifier is the variable's
+assert hottest['node'] == 'VariableNode' and hottest['lineno'] == 2 and hottest['calls'] == 2
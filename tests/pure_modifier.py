@@ -0,0 +1,28 @@
+from Strana.builtin import builtin
+from Strana.context import Context
+from Strana.library import Library
+from Strana.template import Template
+
+r = Library()
+calls = []
+
+
+@r.register_modifier(name='up', pure=True)
+def up(value, first=False):
+    calls.append(value)
+    return value.title() if first else value.upper()
+
+
+@r.register_modifier(name='count')
+def count(value):
+    return '{}:{}'.format(value, len(calls))
+
+
+for compiled in (False, True):
+    del calls[:]
+    t = Template('{= "abc">>up =} {= 4 =} {= name>>up=>True =} {= name>>up>>count =}', None, [r, builtin], compiled)
+    # The constants were folded while parsing
+    print(t.node_list, calls)
+    for name in ('strana', 'strana', 'engine'):
+        print(t.render(Context(None, {'name': name}, 'root')))
+    assert calls == ['abc', 'strana', 'strana', 'engine', 'engine']
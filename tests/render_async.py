@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+from Strana.builtin import builtin
+from Strana.context import Context
+from Strana.library import Library
+from Strana.template import Template
+
+r = Library()
+fetched = []
+
+
+async def fetch(name, delay=0.05):
+    fetched.append(name)
+    await asyncio.sleep(delay)
+    return name.upper()
+
+
+@r.register_modifier(name='shout')
+async def shout(value):
+    await asyncio.sleep(0.01)
+    return value + '!'
+
+
+@r.basic_action(name='now', need_context=False)
+async def now(node_id):
+    await asyncio.sleep(0.01)
+    return 'later'
+
+
+class User:
+    async def posts(self):
+        return ['a', 'b']
+
+
+source = """{= title =} {= title>>shout =} {> now <}
+{> for row in rows <}[{= row =}]{> /for <}
+{> do 2 times <}{= iteration =}:{= user.posts =} {> /do <}"""
+t = Template(source, None, [builtin, r])
+
+
+async def main():
+    data = {'title': fetch('title'), 'unused': fetch('unused'), 'rows': fetch_rows(), 'user': User()}
+    start = time.perf_counter()
+    output = await t.render_async(Context(None, data, 'root'))
+    elapsed = time.perf_counter() - start
+    print(output)
+    print('{:.3f}s'.format(elapsed), fetched)
+    assert output == "TITLE TITLE! later\n[R0][R1][R2][R3][R4][R5][R6][R7][R8][R9]\n0:['a', 'b'] 1:['a', 'b'] "
+    # Only what the template uses is fetched, the title once even though it's used twice
+    assert 'unused' not in fetched and fetched.count('title') == 1
+    # The rows are awaited at the same time
+    assert elapsed < 0.3
+    data['unused'].close()
+
+    # A body storing a variable is rendered node after node
+    stored = Template('{> for row in rows <}{> now as n <}{= n =}{= row =}{> /for <}', None, [builtin, r])
+    output = await stored.render_async(Context(None, {'rows': ['x', 'y']}, 'root'))
+    assert output == 'laterxlatery', output
+
+
+async def fetch_rows():
+    return [fetch('r{}'.format(i)) for i in range(10)]
+
+
+asyncio.run(main())
+for _ in range(2):
+    fetched.clear()
+    # The memo of awaited values belongs to one render
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+import os
+import pickle
+import shutil
+import tempfile
+from timeit import default_timer
+
+from Strana.cache import FileFragmentCache
+from Strana.context import Context
+from Strana.engine import DefaultEngine
+from Strana.profile import Profiler
+from Strana.template import Template
+
+source = """Dear {= name =},
+{> for item in items <}  * {= item =}
+{> /for <}{> do 3 times <}{= iteration =}{> /do <}
+"""
+t = Template(source)
+contexts = [{'name': 'recipient {}'.format(i), 'items': list(range(i % 20))} for i in range(20000)]
+
+start = default_timer()
+serial = [t.render(Context(None, c, 'root')) for c in contexts]
+print('serial:   {:.2f} s'.format(default_timer() - start))
+
+start = default_timer()
+parallel = list(t.render_many(contexts, workers=4, chunksize=256))
+print('parallel: {:.2f} s'.format(default_timer() - start))
+assert parallel == serial
+
+# Small batches and Context objects are rendered in this process
+assert list(t.render_many([Context(None, contexts[0], 'root')])) == serial[:1]
+print(parallel[1])
+
+# Workers get an engine made from the options of this one, fragments cached in files are shared with them
+path = tempfile.mkdtemp()
+try:
+    engine = DefaultEngine('tests/templates', fragment_cache=FileFragmentCache(path), strict_variables={'name'})
+    t = Template('{> cache "greeting" 60 <}hello {= name =}{> /cache <}', engine)
+    copy = pickle.loads(pickle.dumps(t))
+    assert copy.engine.templates_path == 'tests/templates' and copy.engine.strict_variables == {'name'}
+    assert isinstance(copy.engine.fragment_cache, FileFragmentCache) and copy.engine.fragment_cache.directory == path
+    # The cache has no stampede protection, fill it first so every worker reads the same fragment
+    assert t.render(Context(engine, {'name': 'first'}, 'root')) == 'hello first'
+    results = list(t.render_many([{'name': i} for i in range(1000)], workers=2))
+    assert set(results) == {'hello first'} and os.listdir(path)
+    # The profiler of an engine only sees renders in its own process
+    engine.profiler = Profiler()
+    list(t.render_many([{'name': i} for i in range(1000)], workers=2))
+    assert engine.profiler.entries()[0].calls == 1000
+finally:
+    shutil.rmtree(path)
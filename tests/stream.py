@@ -0,0 +1,18 @@
+import io
+
+from Strana.context import Context
+from Strana.template import Template
+
+source = """Report for {= title =}
+{> for row in rows <}{= row =}
+{> /for <}{> do 2 times <}done {= iteration =}
+{> /do <}"""
+t = Template(source)
+data = {'title': 'stream', 'rows': range(5)}
+for chunk in t.stream(Context(None, data, 'root')):
+    print(repr(chunk))
+
+out = io.StringIO()
+t.render_to(Context(None, data, 'root'), out)
+assert out.getvalue() == t.render(Context(None, data, 'root'))
+print(out.getvalue())
@@ -0,0 +1,26 @@
+import io
+import mmap
+import os
+import tempfile
+
+from Strana.context import Context
+from Strana.template import Lexer, Template
+
+row = '<tr><td>{= row =}</td>{> do 2 times <}<td>{= iteration =}</td>{> /do <}</tr>\n'
+source = 'Title {= title =}\n' + row * 1000
+
+# Small chunks, the lexer only keeps the current chunk in memory
+for token in list(Lexer(io.StringIO(source), chunk_size=64).iter_tokens())[:6]:
+    print(token)
+
+path = tempfile.mktemp()
+try:
+    with open(path, 'wb') as f:
+        f.write(source.encode())
+    context = {'title': 'mmap', 'row': 'r'}
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        t = Template(m)
+    assert t.render(Context(None, context, 'root')) == Template(source).render(Context(None, context, 'root'))
+    print(t.render(Context(None, context, 'root'))[:100])
+finally:
+    os.remove(path)
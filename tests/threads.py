@@ -0,0 +1,74 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+from Strana.builtin import builtin
+from Strana.context import Context
+from Strana.engine import DefaultEngine
+from Strana.library import Library
+from Strana.template import Template
+
+r = Library()
+
+
+@r.basic_action(name='label', need_context=False)
+def label(node_id, value):
+    return 'user-{}'.format(value)
+
+
+tickets = count()
+
+
+@r.basic_action(name='ticket', need_context=False)
+def ticket(node_id):
+    return next(tickets)
+
+
+@r.register_modifier(name='twice', pure=True)
+def twice(value):
+    return value * 2
+
+
+source = ('{> label who as name <}{= name =}:{> for i in items <}{> label i as name <}{= name =}{= i>>twice =},'
+          '{> /for <}{> do 3 times <}{= iteration =}{= who =}{> /do <}|{= name =}')
+shared = Context(None, {'items': [1, 2, 3]}, 'root')
+
+
+def expected(who):
+    return 'user-{0}:user-12,user-24,user-36,0{0}1{0}2{0}|user-{0}'.format(who)
+
+
+def render(args):
+    t, who = args
+    context = shared.push_temporary({'who': who}, 'request')
+    return t.render(context), t.render(context), ''.join(t.stream(context)), who
+
+
+for compiled in (False, True):
+    t = Template(source, None, [builtin, r], compiled)
+    with ThreadPoolExecutor(16) as pool:
+        for outputs in pool.map(render, [(t, who) for who in range(2000)]):
+            who = outputs[-1]
+            assert outputs[:-1] == (expected(who),) * 3, outputs
+    # Nothing the renders stored is visible from the shared context
+    assert 'name' not in str(shared.context)
+    print(t.render(shared.push_temporary({'who': 'x'}, 'request')))
+
+# Every render of the same context gets a frame of its own for what it stores
+t = Template('{> ticket as n <}{= n =}{> for i in items <} {= n =}{> /for <}', None, [builtin, r])
+with ThreadPoolExecutor(16) as pool:
+    for output in pool.map(lambda _: t.render(shared), range(5000)):
+        assert len(set(output.split())) == 1, output
+assert "'n'" not in str(shared.context)
+
+# Frames sharing an id shadow each other, they aren't merged
+engine = DefaultEngine()
+nested = Context(engine, {'a': 1, 'b': 2}, 'req').push_temporary({'a': 5}, 'req')
+assert Template('{= a =}{= b =}', engine).render(nested) == '52'
+
+# Templates are loaded once however many threads ask for them
+templates = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+engine = DefaultEngine(templates)
+with ThreadPoolExecutor(16) as pool:
+    loaded = list(pool.map(lambda _: engine.get_template('page'), range(200)))
+assert all(template is loaded[0] for template in loaded)
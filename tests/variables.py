@@ -0,0 +1,74 @@
+import os
+
+from Strana.builtin import builtin
+from Strana.context import Context
+from Strana.engine import DefaultEngine
+from Strana.exception import UnknownVariableException
+from Strana.library import Library
+from Strana.template import Template
+
+r = Library()
+
+
+@r.basic_action(name='label', need_context=False)
+def label(node_id, value):
+    return value
+
+
+@r.register_modifier(name='join')
+def join(value, separator):
+    return separator.join(value)
+
+
+@r.pattern_action(name='twice', pattern='twice', need_body=True, need_context=True, binds=('pass_no',))
+def twice(node_id, body, context):
+    for i in range(2):
+        yield ''.join(str(node.render(context.push_temporary({'pass_no': i}, node_id))) for node in body)
+
+
+source = """{= user.name =} {= user.address.city =} {= tags>>join=>sep =}
+{> label user.id as uid <}{= uid =}
+{> for order, total in orders <}{= order.id =} {= total =} {= loop.index =} {= currency =}{> /for <}
+{> do 2 times <}{= iteration =}{= banner =}{> /do <}
+{> twice <}{= pass_no =}{> /twice <}{= True =}"""
+t = Template(source, None, [builtin, r])
+required = t.required_variables()
+print(sorted((name, sorted(paths)) for name, paths in required.items()))
+assert required == {'user': {'user.name', 'user.address.city', 'user.id'}, 'tags': {'tags'}, 'sep': {'sep'},
+                    'orders': {'orders'}, 'currency': {'currency'}, 'banner': {'banner'}}
+
+t.check_variables({'user', 'tags', 'sep', 'orders', 'currency', 'banner'})
+try:
+    t.check_variables({'user', 'tags'})
+except UnknownVariableException as e:
+    print(e)
+
+# Included templates are part of the analysis, an engine can refuse templates reading unknown names
+templates = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+print(DefaultEngine(templates).get_template('page').required_variables())
+try:
+    DefaultEngine(templates, strict_variables={'title', 'items'}).get_template('page')
+except UnknownVariableException as e:
+    print(e)
+DefaultEngine(templates, strict_variables={'title', 'items', 'site'}).get_template('page')
+
+# A partial is checked in the scope including it, with the loop variables of that scope
+engine = DefaultEngine(templates, strict_variables={'items'})
+print(engine.get_template('list').render(Context(engine, {'items': [1, 2]}, 'root')))
+try:
+    engine.get_template('row')
+except UnknownVariableException as e:
+    print(e)
+else:
+    raise AssertionError('row reads item, which the engine doesn\'t know')
+
+# Templates built directly are checked, whatever the engine is loading in other threads
+engine.loading.add('elsewhere')
+try:
+    Template('{= bogus =}', engine)
+except UnknownVariableException as e:
+    print(e)
+else:
+    raise AssertionError('bogus is unknown to the engine')
+finally:
+    engine.loading.discard('elsewhere')